@@ -0,0 +1,487 @@
+import io
+import json
+import platform
+import subprocess
+import timeit
+
+import numpy as np
+
+import date as dates
+
+from datetime import date, datetime
+from pathlib import Path
+
+HERE = Path(__file__).parent
+DATA = HERE / 'data'
+RESULTS = HERE / '.bench'
+SCALES = (1, 10, 100)
+
+# name : (setup, scaled).  Scaled setups take the data scale, the others
+# have a fixed size and only run at scale 1
+benchmarks = { }
+
+
+def benchmark(name, scaled=False):
+    def decorator(setup):
+        benchmarks[name] = (setup, scaled)
+        return setup
+
+    return decorator
+
+
+def random_intervals(runs, days=3650, longest=120, seed=0):
+    rng = np.random.default_rng(seed)
+
+    starts = np.datetime64('2015-01-01') + rng.integers(0, days, runs)
+    ends = starts + rng.integers(0, longest, runs)
+
+    return starts, ends
+
+
+def segment_all(segment, starts, ends):
+    return [
+        (i, fragment)
+        for i, (a, b) in enumerate(zip(starts, ends))
+        for fragment in segment(a, b)
+    ]
+
+
+def split_benchmarks(period, segment, runs=100000):
+    @benchmark('split_intervals.{}.bulk'.format(period))
+    def bulk():
+        starts, ends = random_intervals(runs)
+        return lambda: dates.split_intervals(starts, ends, period)
+
+    @benchmark('split_intervals.{}.generator'.format(period))
+    def generator():
+        starts, ends = random_intervals(runs)
+        starts, ends = starts.tolist(), ends.tolist()
+        return lambda: segment_all(segment, starts, ends)
+
+
+split_benchmarks('week', dates.segment_to_week)
+split_benchmarks('month', dates.segment_to_month)
+split_benchmarks('broadcast_month', dates.segment_to_broadcast_month)
+
+
+def random_clock_ins(runs, seed=0):
+    rng = np.random.default_rng(seed)
+
+    days = np.datetime64('2019-01-01') + rng.integers(0, 365, runs)
+    seconds = rng.integers(0, 86400, runs)
+
+    return days.astype('datetime64[us]') + seconds.astype('timedelta64[s]')
+
+
+@benchmark('time_of_day.datetime.scalar')
+def time_of_day_scalar(runs=100000):
+    stamps = random_clock_ins(runs).tolist()
+    return lambda: [ dates.to_time(t) for t in stamps ]
+
+
+@benchmark('time_of_day.datetime64.array')
+def time_of_day_array(runs=100000):
+    stamps = random_clock_ins(runs)
+    return lambda: dates.time_of_day_array(stamps)
+
+
+@benchmark('seconds_of_day.time.scalar')
+def seconds_of_day_scalar(runs=100000):
+    times = [ t.time() for t in random_clock_ins(runs).tolist() ]
+    return lambda: [ dates.time_to_seconds(t) for t in times ]
+
+
+@benchmark('seconds_of_day.time.batch')
+def seconds_of_day_batch(runs=100000):
+    times = [ t.time() for t in random_clock_ins(runs).tolist() ]
+    return lambda: dates.times_to_seconds_array(times)
+
+
+@benchmark('seconds_of_day.datetime64.array')
+def seconds_of_day_array(runs=100000):
+    stamps = random_clock_ins(runs)
+    return lambda: dates.seconds_of_day_array(stamps)
+
+
+@benchmark('to_timedelta.time.scalar')
+def to_timedelta_scalar(runs=100000):
+    times = [ t.time() for t in random_clock_ins(runs).tolist() ]
+    return lambda: [ dates.to_timedelta(t) for t in times ]
+
+
+@benchmark('to_timedelta.seconds.array')
+def to_timedelta_array(runs=100000):
+    seconds = dates.seconds_of_day_array(random_clock_ins(runs))
+    return lambda: dates.seconds_to_timedelta64(seconds)
+
+
+def shift_years(d, years):
+    try:
+        return d.replace(year=d.year + years)
+    except ValueError:
+        return d.replace(year=d.year + years, day=28)
+
+
+def read_lines(path):
+    with path.open() as fd:
+        header = next(fd).rstrip('\n')
+        return header, [ line.rstrip('\n').split(',') for line in fd if line.strip() ]
+
+
+# Synthetic copies of data/ repeat the real records once per year, so a
+# scale of 10 is ten years of revenue, payroll and profit and loss
+
+def write_revenue(path, scale, rng):
+    header, rows = read_lines(DATA / 'revenue.csv')
+
+    with path.open('w') as fd:
+        print(header, file=fd)
+
+        for year in range(scale):
+            for type, start, end, revenue in rows:
+                start = shift_years(date.fromisoformat(start), year)
+                end = shift_years(date.fromisoformat(end), year)
+                revenue = float(revenue) * rng.uniform(.8, 1.2)
+
+                print('{},{},{},{:.2f}'.format(type, start, end, revenue), file=fd)
+
+
+def write_payroll(path, scale, rng):
+    header, rows = read_lines(DATA / 'payroll.csv')
+
+    with path.open('w') as fd:
+        print(header, file=fd)
+
+        for year in range(scale):
+            for start, end, name, role, hours, hourly, total in rows:
+                start = shift_years(date.fromisoformat(start), year)
+                end = shift_years(date.fromisoformat(end), year)
+                factor = rng.uniform(.8, 1.2)
+
+                print('{},{},{},{},{:.2f},{},{:.2f}'.format(
+                    start, end, name, role,
+                    float(hours) * factor,
+                    hourly,
+                    float(total) * factor,
+                ), file=fd)
+
+
+def write_profit_loss(path, scale, rng):
+    from psv import read_psv
+
+    matrix = read_psv(DATA / 'profit_loss.psv')
+    months = [ m for m in matrix.columns.tolist() if m is not None ]
+
+    values = np.nan_to_num(matrix.values[:, [ m is not None for m in matrix.columns.tolist() ]])
+    values = np.tile(values, scale) * rng.uniform(.8, 1.2, (len(values), len(months) * scale))
+
+    months = [ shift_years(m, year) for year in range(scale) for m in months ]
+    width = max(map(len, matrix.rows.tolist()))
+
+    with path.open('w') as fd:
+        print(' | '.join([ 'category'.ljust(width) ] + [ m.isoformat() for m in months ]), file=fd)
+
+        for label, row in zip(matrix.rows.tolist(), values.tolist()):
+            print(' | '.join([ label.ljust(width) ] + [ '{:,.2f}'.format(v) for v in row ]), file=fd)
+
+
+synthetic_files = {
+    'revenue.csv'     : write_revenue,
+    'payroll.csv'     : write_payroll,
+    'profit_loss.psv' : write_profit_loss,
+}
+
+
+def synthetic_data(scale, directory=RESULTS / 'data'):
+    directory = Path(directory) / str(scale)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for name, write in synthetic_files.items():
+        path = directory / name
+
+        if not path.exists():
+            write(path, scale, np.random.default_rng(scale))
+
+    return directory
+
+
+def loader_benchmark(name, filename, load):
+    @benchmark(name, scaled=True)
+    def setup(scale):
+        import tasks
+
+        path = synthetic_data(scale) / filename
+        return lambda: load(tasks, path)
+
+
+# The loaders go through the parsers directly: the disk-cached entry points
+# would time cache hits after the first run and fill data/.cache with
+# entries for the synthetic files
+
+loader_benchmark('read_csv', 'revenue.csv', lambda tasks, path: list(tasks.read_csv(path)))
+loader_benchmark('read_columns', 'revenue.csv', lambda tasks, path: tasks.read_columns(path))
+loader_benchmark('revenue_records', 'revenue.csv', lambda tasks, path: list(tasks.table_revenue_records(tasks.read_columns(path))))
+loader_benchmark('payroll_records', 'payroll.csv', lambda tasks, path: tasks.read_columns(path).records(tasks.PayrollRecord))
+loader_benchmark('read_psv', 'profit_loss.psv', lambda tasks, path: tasks.read_psv(path))
+loader_benchmark('profit_loss_records', 'profit_loss.psv', lambda tasks, path: tasks.read_psv(path).records())
+loader_benchmark('fixed_profit_loss_records', 'profit_loss.psv', lambda tasks, path: tasks.fix_profit_loss(tasks.read_psv(path)))
+
+
+@benchmark('values_by_month_model', scaled=True)
+def values_by_month_model(scale):
+    import tasks
+
+    cells = [
+        (month, model)
+        for model, months in tasks.parse_models().items()
+        for month in months
+    ]
+
+    evaluate = tasks.values_by_month_model.__wrapped__
+
+    return lambda: [ evaluate(month, model) for _ in range(scale) for month, model in cells ]
+
+
+@benchmark('make_projection_spreadsheet')
+def make_projection_spreadsheet():
+    import tasks
+
+    def body():
+        tasks.scenario_cube.cache_clear()
+        tasks.projection_workbook().save(io.BytesIO())
+
+    return body
+
+
+@benchmark('stream_projection_spreadsheet')
+def stream_projection_spreadsheet():
+    import tasks
+
+    def body():
+        tasks.scenario_cube.cache_clear()
+        tasks.stream_workbook(io.BytesIO(), tasks.projection_sheets())
+
+    return body
+
+
+def synthetic_projection(models=100, years=10, seed=0):
+    import tasks
+
+    rng = np.random.default_rng(seed)
+
+    months = list(dates.month_periods(date(2021, 1, 1), date(2020 + years, 12, 1)))
+    names = [ 'model {}'.format(i) for i in range(models) ]
+
+    # Each model steps up through phases 1, 2 and 3 at random months
+    steps = np.sort(rng.integers(0, len(months), (models, 3)), axis=1)
+    phases = (np.arange(len(months)) >= steps[:, :, None]).sum(axis=1)
+
+    schedule = tasks.rent_schedule + [ (date(2020 + years, 12, 1), -3700.) ]
+    assumptions = tasks.model_assumptions()._replace(rent_schedule=schedule)
+
+    return names, months, phases, assumptions
+
+
+def projection_benchmark(name, sheets):
+    @benchmark('projection.10y.100.{}'.format(name))
+    def setup():
+        import tasks
+
+        names, months, phases, assumptions = synthetic_projection()
+        cube = tasks.evaluate(names, months, phases, assumptions)
+
+        return lambda: tasks.stream_workbook(io.BytesIO(), sheets(tasks, cube, phases, assumptions))
+
+
+def value_sheets(native):
+    def sheets(tasks, cube, phases, assumptions):
+        for name in cube.models:
+            yield name, tasks.matrix_rows(name, cube.months, cube.items, cube.model(name), native)
+
+    return sheets
+
+
+def formula_sheets(tasks, cube, phases, assumptions):
+    rows, refs = tasks.assumption_rows(assumptions)
+    yield tasks.ASSUMPTIONS, rows
+
+    for name, by_month in zip(cube.models, phases.tolist()):
+        yield name, tasks.formula_sheet_rows(name, cube.months, dict(zip(cube.months, by_month)), refs)
+
+
+@benchmark('projection.10y.100.evaluate')
+def evaluate_projection():
+    import tasks
+
+    names, months, phases, assumptions = synthetic_projection()
+    return lambda: tasks.evaluate(names, months, phases, assumptions)
+
+
+projection_benchmark('strings', value_sheets(False))
+projection_benchmark('native', value_sheets(True))
+projection_benchmark('formulas', formula_sheets)
+
+
+@benchmark('column_letters.16384')
+def column_letters():
+    import tasks
+
+    return lambda: [ tasks.column_index(tasks.column_letters(i)) for i in range(1, 16385) ]
+
+
+def random_days(runs, days=3650, longest=60, seed=0):
+    starts, ends = random_intervals(runs, days, longest, seed)
+    return starts.tolist(), ends.tolist()
+
+
+def random_times(runs, longest=60, seed=0):
+    rng = np.random.default_rng(seed)
+
+    starts = random_clock_ins(runs, seed)
+    ends = starts + rng.integers(0, longest * 86400, runs).astype('timedelta64[s]')
+
+    return starts.tolist(), ends.tolist()
+
+
+def date_benchmarks(names, sample, call):
+    for name in names:
+        def setup(scale, function=getattr(dates, name)):
+            starts, ends = sample(1000 * scale)
+            return lambda: [ call(function, a, b) for a, b in zip(starts, ends) ]
+
+        benchmark('date.{}'.format(name), scaled=True)(setup)
+
+
+def exhaust(function, a, b):
+    return list(function(a, b))
+
+
+def single(function, a, b):
+    result = function(a)
+    return result if isinstance(result, tuple) else list(result)
+
+
+date_benchmarks([
+    'dates_in_range',
+    'weeks_in_range',
+    'months_in_range',
+    'broadcast_months_in_range',
+    'segment_to_week',
+    'segment_to_month',
+    'segment_to_broadcast_month',
+    'align_to_days',
+    'align_to_weeks',
+    'align_to_months',
+    'align_to_broadcast_months',
+    'day_periods',
+    'week_periods',
+    'month_periods',
+    'broadcast_month_periods',
+], random_days, exhaust)
+
+date_benchmarks([
+    'segment_to_day',
+    'segment_to_broadcast_day',
+    'align_to_broadcast_days',
+    'broadcast_day_periods',
+], random_times, exhaust)
+
+date_benchmarks([
+    'dates_in_week',
+    'dates_in_month',
+    'dates_in_broadcast_month',
+    'week_range',
+    'month_range',
+    'broadcast_month_range',
+], random_days, single)
+
+date_benchmarks([
+    'broadcast_day_range',
+], random_times, single)
+
+
+def run(pattern='', repeat=3, scales=(1,)):
+    results = { }
+
+    for scale in scales:
+        timings = { }
+
+        for name, (setup, scaled) in benchmarks.items():
+            if pattern not in name or not (scaled or scale == 1):
+                continue
+
+            body = setup(scale) if scaled else setup()
+            timings[name] = min(timeit.repeat(body, number=1, repeat=repeat))
+
+        results[scale] = timings
+
+    return results
+
+
+def git(*args):
+    try:
+        return subprocess.run(
+            [ 'git' ] + list(args),
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def revision():
+    return git('rev-parse', '--short', 'HEAD') or 'unknown'
+
+
+def results_file(name, directory=RESULTS):
+    path = Path(name)
+
+    if path.suffix == '.json' and path.exists():
+        return path
+
+    return Path(directory) / '{}.json'.format(name)
+
+
+def load(name, directory=RESULTS):
+    return json.loads(results_file(name, directory).read_text())
+
+
+def save(results, repeat, directory=RESULTS):
+    # One file per revision, merged so filtered runs add to earlier ones
+
+    rev = revision()
+    path = results_file(rev, directory)
+
+    document = load(rev, directory) if path.exists() else { 'results' : { } }
+
+    document.update({
+        'revision' : rev,
+        'dirty'    : bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created'  : datetime.now().isoformat(timespec='seconds'),
+        'python'   : platform.python_version(),
+        'numpy'    : np.__version__,
+        'repeat'   : repeat,
+    })
+
+    for scale, timings in results.items():
+        document['results'].setdefault(str(scale), { }).update(timings)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(document, indent=2, sort_keys=True))
+    tmp.replace(path)
+
+    return path
+
+
+def baseline(results, document):
+    previous = document['results']
+
+    return {
+        (scale, name) : previous.get(str(scale), { }).get(name)
+        for scale, timings in results.items()
+        for name in timings
+    }
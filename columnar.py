@@ -0,0 +1,159 @@
+import numpy as np
+
+from pathlib import Path
+
+
+class Columns(dict):
+    def __init__(self, columns=(), categories=None):
+        super().__init__(columns)
+        self.categories = dict(categories or { })
+
+
+    @property
+    def rows(self):
+        for values in self.values():
+            return len(values)
+
+        return 0
+
+
+    def labels(self, name):
+        values = self[name]
+
+        if name in self.categories:
+            return self.categories[name][values]
+
+        return values
+
+
+    def records(self, factory):
+        columns = [ self.labels(f).tolist() for f in factory._fields ]
+
+        for row in zip(*columns):
+            yield factory(*row)
+
+
+    def to_arrays(self):
+        arrays = { 'column:' + h : v for h, v in self.items() }
+        arrays.update(('category:' + h, v) for h, v in self.categories.items())
+
+        return arrays
+
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        table = cls()
+
+        for key, values in arrays.items():
+            kind, name = key.split(':', 1)
+
+            if kind == 'category':
+                table.categories[name] = values
+            else:
+                table[name] = values
+
+        return table
+
+
+    def sum_by(self, key, values):
+        if isinstance(values, str):
+            values = self[values]
+
+        if key in self.categories:
+            codes, labels = self[key], self.categories[key]
+        else:
+            labels, codes = np.unique(self[key], return_inverse=True)
+
+        sums = np.bincount(codes, weights=values, minlength=len(labels))
+
+        return dict(zip(labels.tolist(), sums.tolist()))
+
+
+def to_dates(values, errors='raise'):
+    values = np.char.strip(values)
+
+    try:
+        dates = values.astype('datetime64[D]')
+    except ValueError:
+        pass
+    else:
+        # numpy reads blank and 'NaT' cells as NaT rather than failing
+
+        missing = np.isnat(dates)
+
+        if errors != 'coerce' and missing.any():
+            raise ValueError('date not valid. date = {!r}'.format(values[missing][0].item()))
+
+        return dates
+
+    # Not ISO formatted, so fall back to dateutil once per distinct string
+    # rather than once per cell
+
+    import dateutil.parser as parser
+
+    def parse(d):
+        try:
+            return parser.parse(d).date()
+        except (ValueError, OverflowError):
+            if errors == 'coerce':
+                return None
+
+            raise ValueError('date not valid. date = {!r}'.format(d)) from None
+
+    unique, inverse = np.unique(values, return_inverse=True)
+    parsed = np.array([ parse(d) for d in unique.tolist() ], dtype='datetime64[D]')
+
+    return parsed[inverse]
+
+
+def to_floats(values):
+    return values.astype(np.float64)
+
+
+def to_categorical(values):
+    categories, codes = np.unique(np.char.strip(values), return_inverse=True)
+    return codes.astype(np.int32), categories
+
+
+column_converters = {
+    'end_date'   : to_dates,
+    'hourly'     : to_floats,
+    'hours'      : to_floats,
+    'name'       : to_categorical,
+    'revenue'    : to_floats,
+    'role'       : to_categorical,
+    'start_date' : to_dates,
+    'total'      : to_floats,
+    'type'       : to_categorical,
+}
+
+
+def read_columns(path, converters=column_converters, sep=','):
+    path = Path(path)
+
+    lines = path.read_text().splitlines()
+    header = [ h.strip() for h in lines[0].split(sep) ]
+    body = [ line for line in lines[1:] if line.strip() ]
+
+    cells = np.array(sep.join(body).split(sep)) if body else np.empty(0, dtype=str)
+
+    if cells.size != len(body) * len(header):
+        raise ValueError('ragged rows in {}'.format(path))
+
+    cells = cells.reshape(len(body), len(header))
+
+    table = Columns()
+
+    for i, h in enumerate(header):
+        convert = converters[h]
+        try:
+            values = convert(cells[:, i])
+        except ValueError as e:
+            raise ValueError('{} column {}: {}'.format(path, h, e)) from e
+
+        if isinstance(values, tuple):
+            values, table.categories[h] = values
+
+        table[h] = values
+
+    return table
@@ -0,0 +1,152 @@
+import time
+
+import numpy as np
+
+from collections import namedtuple
+from datetime import date
+from pathlib import Path
+
+from date import month_periods
+
+Rule = namedtuple('Rule', [ 'op', 'categories', 'months' ])
+CompiledRule = namedtuple('CompiledRule', [ 'name', 'op', 'rows', 'columns' ])
+
+
+def negate(values, rows, columns):
+    values[np.ix_(rows, columns)] *= -1
+
+
+def swap(values, rows, columns):
+    block = values[np.ix_(rows, columns)]
+    values[np.ix_(rows, columns)] = block[::-1]
+
+
+def split(values, rows, columns):
+    # The last month holds the whole rolled over amount; whatever the earlier
+    # months hold is overwritten, not added
+    last = values[np.ix_(rows, columns[-1:])]
+    values[np.ix_(rows, columns)] = last / len(columns)
+
+
+def zero(values, rows, columns):
+    values[np.ix_(rows, columns)] = 0.
+
+
+def average(values, rows, columns):
+    others = np.ones(values.shape[1], dtype=bool)
+    others[columns] = False
+
+    means = values[np.ix_(rows, others)].mean(axis=1, keepdims=True)
+    values[np.ix_(rows, columns)] = means
+
+
+operations = {
+    'negate'  : negate,
+    'swap'    : swap,
+    'split'   : split,
+    'zero'    : zero,
+    'average' : average,
+}
+
+
+def parse_months(text):
+    text = text.strip()
+
+    if text == '*':
+        return None
+
+    months = [ ]
+
+    for part in text.split(','):
+        start, _, end = (p.strip() for p in part.partition('..'))
+        start = date.fromisoformat(start)
+
+        if end:
+            months.extend(month_periods(start, date.fromisoformat(end)))
+        else:
+            months.append(start)
+
+    return months
+
+
+def parse_rules(text):
+    lines = (line.split('#', 1)[0].strip() for line in text.splitlines())
+    lines = (line for line in lines if line)
+
+    header = [ h.strip() for h in next(lines).split('|') ]
+
+    rules = [ ]
+
+    for line in lines:
+        record = dict(zip(header, (r.strip() for r in line.split('|'))))
+
+        if record['op'] not in operations:
+            raise ValueError('unknown correction. op = {}'.format(record['op']))
+
+        categories = record['categories']
+
+        if not categories.startswith('@'):
+            categories = [ c.strip() for c in categories.split(',') ]
+
+        rules.append(Rule(record['op'], categories, parse_months(record['months'])))
+
+    return rules
+
+
+def read_rules(path):
+    return parse_rules(Path(path).read_text())
+
+
+class Corrections:
+    def __init__(self, rules):
+        self.rules = rules
+        self.timings = [ ]
+
+
+    def apply(self, values):
+        for rule in self.rules:
+            start = time.perf_counter()
+            operations[rule.op](values, rule.rows, rule.columns)
+            self.timings.append((rule.name, time.perf_counter() - start))
+
+        return values
+
+
+def compile_rules(rules, categories, months, groups=None):
+    category_index = { c : i for i, c in enumerate(categories) }
+    month_index = { m : j for j, m in enumerate(months) }
+
+    compiled = [ ]
+
+    for rule in rules:
+        # Groups and '*' apply to whatever is present, while explicitly
+        # named cells must all exist or the rule is skipped
+
+        if isinstance(rule.categories, str):
+            wanted = groups[rule.categories[1:]]
+            rows = [ i for c, i in category_index.items() if c in wanted ]
+        elif all(c in category_index for c in rule.categories):
+            rows = [ category_index[c] for c in rule.categories ]
+        else:
+            continue
+
+        if rule.months is None:
+            columns = list(month_index.values())
+        elif all(m in month_index for m in rule.months):
+            columns = [ month_index[m] for m in rule.months ]
+        else:
+            continue
+
+        if not rows or not columns:
+            continue
+
+        categories = rule.categories
+
+        if not isinstance(categories, str):
+            categories = ', '.join(categories)
+
+        name = '{} {}'.format(rule.op, categories)
+
+        compiled.append(CompiledRule(name, rule.op, np.array(rows), np.array(columns)))
+
+    return Corrections(compiled)
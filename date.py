@@ -1,4 +1,13 @@
-from datetime import date, datetime, time, timedelta;
+from datetime import date, datetime, time, timedelta, timezone;
+
+import os;
+import tempfile;
+
+import numpy as np;
+
+from collections import namedtuple;
+from pathlib import Path;
+from zoneinfo import ZoneInfo;
 
 def to_datetime(t):
     if type(t) == datetime: return t;
@@ -10,11 +19,21 @@ def to_date(d):
 
 def to_time(t):
     if type(t) == time: return t;
-    return time(t.hour, t.seconds / 60, t.seconds % 60, t.microseconds);
+    if isinstance(t, datetime): return t.time();
+    return seconds_to_time(t.seconds, t.microseconds);
 
 def to_timedelta(d):
     if type(d) == timedelta: return d;
-    return timedelta(hours = t.hour, seconds = t.minute * 60 + t.second, microseconds = t.microsecond);
+    return timedelta(seconds = time_to_seconds(d), microseconds = d.microsecond);
+
+def time_to_seconds(t): return (t.hour * 60 + t.minute) * 60 + t.second;
+
+def seconds_to_time(s, microseconds = 0):
+    minutes, second = divmod(s % 86400, 60);
+    hour, minute = divmod(minutes, 60);
+    return time(hour, minute, second, microseconds);
+
+def timedelta_to_seconds(d): return d.days * 86400 + d.seconds;
 
 def broadcast_day_inc(t): return start_of_broadcast_day(t + timedelta(1));
 
@@ -155,3 +174,411 @@ def month_range(d):
 
 def broadcast_month_range(d):
     return align_to_broadcast_months(d, d);
+
+# Closed form period ordinals: day and week ordinals count from 0001-01-01,
+# which is a Monday, and month ordinals are year * 12 + month - 1.
+
+def day_ordinal(d): return to_date(d).toordinal();
+
+def day_from_ordinal(i): return date.fromordinal(i);
+
+def week_ordinal(d): return (to_date(d).toordinal() - 1) // 7;
+
+def week_from_ordinal(i): return date.fromordinal(i * 7 + 1);
+
+def month_ordinal(d): return d.year * 12 + d.month - 1;
+
+def month_from_ordinal(i): return date(i // 12, i % 12 + 1, 1);
+
+def broadcast_day_ordinal(t):
+    if isinstance(t, datetime): t -= timedelta(hours = 6);
+    return to_date(t).toordinal();
+
+def broadcast_day_from_ordinal(i): return to_datetime(date.fromordinal(i)) + timedelta(hours = 6);
+
+def broadcast_month_ordinal(d): return month_ordinal(broadcast_month(to_date(d)));
+
+def broadcast_month_from_ordinal(i): return start_of_broadcast_month(month_from_ordinal(i));
+
+class PeriodRange:
+    def __init__(self, ordinals, value, ordinal):
+        self.ordinals = ordinals;
+        self.value = value;
+        self.ordinal = ordinal;
+
+    def __len__(self): return len(self.ordinals);
+
+    def __iter__(self): return map(self.value, self.ordinals);
+
+    def __reversed__(self): return map(self.value, reversed(self.ordinals));
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return PeriodRange(self.ordinals[i], self.value, self.ordinal);
+        return self.value(self.ordinals[i]);
+
+    def __contains__(self, d):
+        i = self.ordinal(d);
+        return i in self.ordinals and self.value(i) == d;
+
+    def __eq__(self, other):
+        if not isinstance(other, PeriodRange): return NotImplemented;
+        return list(self) == list(other);
+
+    def __repr__(self):
+        if not self.ordinals: return 'PeriodRange()';
+        return 'PeriodRange({!r}, {!r}, {})'.format(self[0], self[-1], len(self));
+
+    def index(self, d):
+        if d not in self: raise ValueError('{!r} is not in range'.format(d));
+        return self.ordinals.index(self.ordinal(d));
+
+def period_range(from_date, to_date, ordinal, value):
+    return PeriodRange(range(ordinal(from_date), ordinal(to_date) + 1), value, ordinal);
+
+def day_periods(from_date, to_date):
+    return period_range(from_date, to_date, day_ordinal, day_from_ordinal);
+
+def week_periods(from_date, to_date):
+    return period_range(from_date, to_date, week_ordinal, week_from_ordinal);
+
+def month_periods(from_date, to_date):
+    return period_range(from_date, to_date, month_ordinal, month_from_ordinal);
+
+def broadcast_day_periods(from_time, to_time):
+    return period_range(from_time, to_time, broadcast_day_ordinal, broadcast_day_from_ordinal);
+
+def broadcast_month_periods(from_date, to_date):
+    return period_range(from_date, to_date, broadcast_month_ordinal, month_from_ordinal);
+
+# Array counterparts of the functions above.  They take anything np.asarray
+# accepts holding datetime64 values and return datetime64 arrays, days in
+# datetime64[D] and times in datetime64[us].
+
+BROADCAST_DAY_OFFSET = np.timedelta64(6, 'h');
+
+def as_days(d): return np.asarray(d).astype('datetime64[D]');
+
+def as_times(t): return np.asarray(t).astype('datetime64[us]');
+
+def as_months(d): return np.asarray(d).astype('datetime64[M]');
+
+def weekday_array(d): return (as_days(d).astype(np.int64) + 3) % 7;
+
+def date_inc_array(d): return as_days(d) + 1;
+
+def date_dec_array(d): return as_days(d) - 1;
+
+def week_inc_array(d): return start_of_week_array(as_days(d) + 7);
+
+def week_dec_array(d): return start_of_week_array(as_days(d) - 7);
+
+def month_inc_array(d): return (as_months(d) + 1).astype('datetime64[D]');
+
+def month_dec_array(d): return (as_months(d) - 1).astype('datetime64[D]');
+
+def broadcast_month_inc_array(d):
+    return start_of_broadcast_month_array(month_inc_array(broadcast_month_array(d)));
+
+def broadcast_month_dec_array(d):
+    return start_of_broadcast_month_array(month_dec_array(broadcast_month_array(d)));
+
+def broadcast_day_inc_array(t): return start_of_broadcast_day_array(as_times(t) + np.timedelta64(1, 'D'));
+
+def start_of_day_array(t): return as_days(t).astype('datetime64[us]');
+
+def end_of_day_array(t): return start_of_day_array(t) + np.timedelta64(1, 'D') - np.timedelta64(1, 'us');
+
+def broadcast_day_array(t):
+    t = np.asarray(t);
+    if t.dtype == np.dtype('datetime64[D]'): return t;
+    return (t - BROADCAST_DAY_OFFSET).astype('datetime64[D]');
+
+def start_of_broadcast_day_array(t):
+    return broadcast_day_array(t).astype('datetime64[us]') + BROADCAST_DAY_OFFSET;
+
+def end_of_broadcast_day_array(t):
+    return start_of_broadcast_day_array(t) + np.timedelta64(1, 'D') - np.timedelta64(1, 'us');
+
+def start_of_week_array(d): d = as_days(d); return d - weekday_array(d);
+
+def end_of_week_array(d): d = as_days(d); return d + (6 - weekday_array(d));
+
+def start_of_month_array(d): return as_months(d).astype('datetime64[D]');
+
+def end_of_month_array(d): return month_inc_array(d) - 1;
+
+def broadcast_month_array(d): return start_of_month_array(end_of_week_array(d));
+
+def start_of_broadcast_month_array(d): return start_of_week_array(broadcast_month_array(d));
+
+def end_of_broadcast_month_array(d): return broadcast_month_inc_array(d) - 1;
+
+# Batch time of day conversions.  Seconds since midnight are int64, times of
+# day are timedelta64[us] and timestamps datetime64[us].
+
+def times_to_seconds_array(times):
+    return np.fromiter(map(time_to_seconds, times), dtype = np.int64, count = len(times));
+
+def seconds_to_times(seconds): return list(map(seconds_to_time, np.asarray(seconds).tolist()));
+
+def seconds_to_timedelta64(seconds): return np.asarray(seconds, dtype = np.int64).astype('timedelta64[s]').astype('timedelta64[us]');
+
+def timedelta64_to_seconds(deltas): return np.asarray(deltas).astype('timedelta64[s]').astype(np.int64);
+
+def timedeltas_to_timedelta64(deltas): return np.array(deltas, dtype = 'timedelta64[us]');
+
+def time_of_day_array(t): t = as_times(t); return t - as_days(t);
+
+def seconds_of_day_array(t): return timedelta64_to_seconds(time_of_day_array(t));
+
+def combine_array(days, time_of_day):
+    return as_days(days).astype('datetime64[us]') + np.asarray(time_of_day).astype('timedelta64[us]');
+
+# Array counterparts of the period ordinals, numbered the same as the scalar
+# ones.
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal();
+
+EPOCH_MONTH = 1970 * 12;
+
+def day_ordinal_array(d): return as_days(d).astype(np.int64) + EPOCH_ORDINAL;
+
+def day_from_ordinal_array(i): return (np.asarray(i) - EPOCH_ORDINAL).astype('datetime64[D]');
+
+def week_ordinal_array(d): return (day_ordinal_array(d) - 1) // 7;
+
+def week_from_ordinal_array(i): return day_from_ordinal_array(np.asarray(i) * 7 + 1);
+
+def month_ordinal_array(d): return as_months(d).astype(np.int64) + EPOCH_MONTH;
+
+def month_from_ordinal_array(i): return (np.asarray(i) - EPOCH_MONTH).astype('datetime64[M]').astype('datetime64[D]');
+
+def broadcast_month_ordinal_array(d): return month_ordinal_array(broadcast_month_array(d));
+
+def broadcast_month_from_ordinal_array(i): return start_of_broadcast_month_array(month_from_ordinal_array(i));
+
+array_periods = {
+    'day'             : (day_ordinal_array, day_from_ordinal_array),
+    'broadcast_day'   : (day_ordinal_array, day_from_ordinal_array),
+    'week'            : (week_ordinal_array, week_from_ordinal_array),
+    'month'           : (month_ordinal_array, month_from_ordinal_array),
+    'broadcast_month' : (broadcast_month_ordinal_array, broadcast_month_from_ordinal_array),
+};
+
+period_offsets = { 'broadcast_day' : BROADCAST_DAY_OFFSET };
+
+# Bulk version of segment_to_date_period/segment_to_time_period.  Intervals
+# are inclusive like the generators: datetime64[D] intervals end on their last
+# day and are split into whole days, anything finer is split at microseconds.
+# Periods always break on period boundaries, broadcast days at 6am.
+
+IntervalFragments = namedtuple('IntervalFragments', ['parents', 'starts', 'ends', 'fractions']);
+
+def as_datetime64(values):
+    values = np.asarray(values);
+    if values.dtype.kind == 'M': return values;
+    return np.array(values.tolist(), dtype = 'datetime64');
+
+def split_intervals(starts, ends, period):
+    ordinal, from_ordinal = array_periods[period];
+
+    starts, ends = as_datetime64(starts), as_datetime64(ends);
+
+    if starts.dtype == np.dtype('datetime64[D]') and ends.dtype == starts.dtype:
+        step, offset = np.timedelta64(1, 'D'), np.timedelta64(0, 'D');
+    else:
+        starts, ends = as_times(starts), as_times(ends);
+        step, offset = np.timedelta64(1, 'us'), period_offsets.get(period, np.timedelta64(0, 'h'));
+
+    first = ordinal(starts - offset);
+    counts = np.where(ends >= starts, ordinal(ends - offset) - first + 1, 0);
+
+    parents = np.repeat(np.arange(len(starts)), counts);
+    index = first[parents] + np.arange(len(parents)) - (np.cumsum(counts) - counts)[parents];
+
+    bounds = from_ordinal(np.concatenate((index, index + 1))).astype(starts.dtype) + offset;
+    lower, upper = bounds[:len(index)], bounds[len(index):];
+
+    fragment_starts = np.maximum(lower, starts[parents]);
+    fragment_ends = np.minimum(upper - step, ends[parents]);
+
+    fractions = (fragment_ends - fragment_starts + step) / (ends - starts + step)[parents];
+
+    return IntervalFragments(parents, fragment_starts, fragment_ends, fractions);
+
+# Calendar dimension: every period a day belongs to, precomputed once for a
+# span of years so the period functions become an index lookup.  Days are
+# stored as int32 offsets from 1970-01-01.  The scalar functions above stay
+# arithmetic: one date is about 3x slower through a numpy lookup than
+# computed, so only array callers go through the table.
+
+CALENDAR_FIELDS = [
+    ('week_start', np.int32),
+    ('month_start', np.int32),
+    ('next_month_start', np.int32),
+    ('broadcast_month', np.int32),
+    ('broadcast_month_start', np.int32),
+    ('next_broadcast_month_start', np.int32),
+    ('weekday', np.int8),
+    ('iso_year', np.int16),
+    ('iso_week', np.int8),
+];
+
+CALENDAR_DAY_FIELDS = { name for name, _ in CALENDAR_FIELDS[:6] };
+
+def iso_week_array(d):
+    thursday = as_days(d) - weekday_array(d) + 3;
+    year = thursday.astype('datetime64[Y]');
+    week = (thursday - year.astype('datetime64[D]')).astype(np.int64) // 7 + 1;
+    return year.astype(np.int64) + 1970, week;
+
+def calendar_fields(days):
+    iso_year, iso_week = iso_week_array(days);
+    return {
+        'week_start'                 : start_of_week_array(days),
+        'month_start'                : start_of_month_array(days),
+        'next_month_start'           : month_inc_array(days),
+        'broadcast_month'            : broadcast_month_array(days),
+        'broadcast_month_start'      : start_of_broadcast_month_array(days),
+        'next_broadcast_month_start' : broadcast_month_inc_array(days),
+        'weekday'                    : weekday_array(days),
+        'iso_year'                   : iso_year,
+        'iso_week'                   : iso_week,
+    };
+
+class Calendar:
+    def __init__(self, first, table):
+        self.first = int(first);
+        self.table = table;
+
+    @classmethod
+    def build(cls, start_year, end_year):
+        first = np.datetime64('{:04d}-01-01'.format(start_year), 'D');
+        last = np.datetime64('{:04d}-01-01'.format(end_year + 1), 'D');
+        days = np.arange(first, last);
+
+        table = np.zeros(len(days), dtype=CALENDAR_FIELDS);
+        for name, values in calendar_fields(days).items():
+            table[name] = values.astype(np.int64) if values.dtype.kind == 'M' else values;
+
+        return cls(first.astype(np.int64), table);
+
+    def save(self, path):
+        # A temporary file of its own per writer, so concurrent builders
+        # each replace the table whole instead of clobbering one another
+        path = Path(path);
+        fd, tmp = tempfile.mkstemp(dir = path.parent, suffix = '.tmp');
+
+        try:
+            with os.fdopen(fd, 'wb') as out: np.save(out, self.table);
+            os.replace(tmp, path);
+        except BaseException:
+            os.unlink(tmp);
+            raise;
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        table = np.load(path, mmap_mode = 'r' if mmap else None);
+        first = table['week_start'][0] + table['weekday'][0];
+        return cls(first, table);
+
+    def __len__(self): return len(self.table);
+
+    def __contains__(self, d):
+        index = as_days(d).astype(np.int64) - self.first;
+        return bool(np.all((index >= 0) & (index < len(self.table))));
+
+    def lookup(self, field, d):
+        scalar = isinstance(d, date);
+        days = as_days(d);
+        index = days.astype(np.int64) - self.first;
+
+        if np.all((index >= 0) & (index < len(self.table))):
+            values = self.table[field][index];
+        else:
+            values = calendar_fields(days)[field];
+
+        if field in CALENDAR_DAY_FIELDS: values = values.astype(np.int64).astype('datetime64[D]');
+
+        return values.item() if scalar else values;
+
+    def start_of_week(self, d): return self.lookup('week_start', d);
+
+    def end_of_week(self, d): return self.lookup('week_start', d) + (timedelta(6) if isinstance(d, date) else 6);
+
+    def week_inc(self, d): return self.lookup('week_start', d) + (timedelta(7) if isinstance(d, date) else 7);
+
+    def start_of_month(self, d): return self.lookup('month_start', d);
+
+    def end_of_month(self, d): return self.lookup('next_month_start', d) - (timedelta(1) if isinstance(d, date) else 1);
+
+    def month_inc(self, d): return self.lookup('next_month_start', d);
+
+    def broadcast_month(self, d): return self.lookup('broadcast_month', d);
+
+    def start_of_broadcast_month(self, d): return self.lookup('broadcast_month_start', d);
+
+    def end_of_broadcast_month(self, d):
+        return self.lookup('next_broadcast_month_start', d) - (timedelta(1) if isinstance(d, date) else 1);
+
+    def broadcast_month_inc(self, d): return self.lookup('next_broadcast_month_start', d);
+
+    def weekday(self, d): return self.lookup('weekday', d);
+
+    def iso_week(self, d): return (self.lookup('iso_year', d), self.lookup('iso_week', d));
+
+def calendar_table(start_year=2000, end_year=2040, directory=None):
+    if directory is None: return Calendar.build(start_year, end_year);
+
+    path = Path(directory) / 'calendar-{}-{}.npy'.format(start_year, end_year);
+
+    try:
+        return Calendar.load(path);
+    except (OSError, ValueError): pass;
+
+    calendar = Calendar.build(start_year, end_year);
+    path.parent.mkdir(parents = True, exist_ok = True);
+    calendar.save(path);
+
+    return Calendar.load(path);
+
+# Broadcast days of a venue for UTC timestamp streams.  Timestamps are
+# datetime64 values in UTC; only one local to UTC conversion is done per day
+# in the span, then every bucket edge is found by binary search.
+
+BroadcastDaySegments = namedtuple('BroadcastDaySegments', ['days', 'starts', 'stops', 'boundaries']);
+
+UTC = timezone.utc;
+
+def utc_array(datetimes):
+    return np.array([ t.astimezone(UTC).replace(tzinfo = None) for t in datetimes ], dtype = 'datetime64[us]');
+
+def local_broadcast_day(t, tz, rollover_hour = 6):
+    local = t.replace(tzinfo = UTC).astimezone(tz);
+    return (local - timedelta(hours = rollover_hour)).date();
+
+def broadcast_day_start_utc(d, tz, rollover_hour = 6):
+    start = datetime.combine(d, time(rollover_hour), tzinfo = tz);
+    return np.datetime64(start.astimezone(UTC).replace(tzinfo = None), 'us');
+
+def segment_to_local_broadcast_days(timestamps, tz, rollover_hour = 6):
+    if isinstance(tz, str): tz = ZoneInfo(tz);
+
+    timestamps = as_times(timestamps);
+    if not len(timestamps):
+        empty = np.empty(0, dtype = np.int64);
+        return BroadcastDaySegments(np.empty(0, dtype = 'datetime64[D]'), empty, empty, np.empty(0, dtype = 'datetime64[us]'));
+
+    first = local_broadcast_day(timestamps[0].item(), tz, rollover_hour);
+    last = local_broadcast_day(timestamps[-1].item(), tz, rollover_hour);
+
+    days = np.arange(np.datetime64(first, 'D'), np.datetime64(last, 'D') + 2);
+    boundaries = np.array([ broadcast_day_start_utc(d, tz, rollover_hour) for d in days.tolist() ]);
+
+    edges = np.searchsorted(timestamps, boundaries, side = 'left');
+
+    return BroadcastDaySegments(days[:-1], edges[:-1], edges[1:], boundaries);
+
+def local_broadcast_day_array(timestamps, tz, rollover_hour = 6):
+    segments = segment_to_local_broadcast_days(timestamps, tz, rollover_hour);
+    return np.repeat(segments.days, segments.stops - segments.starts);
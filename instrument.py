@@ -0,0 +1,182 @@
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import time
+
+from collections import defaultdict
+from pathlib import Path
+
+PROFILES = Path(__file__).parent / '.profile'
+
+# Everything below is a no-op unless enabled, which only profiled tasks do
+enabled = False
+
+timers = defaultdict(lambda: [ 0, 0. ])
+counters = defaultdict(int)
+
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+
+def record(name, seconds):
+    timer = timers[name]
+    timer[0] += 1
+    timer[1] += seconds
+
+
+def count(name, n=1):
+    if enabled:
+        counters[name] += n
+
+
+class stage:
+    __slots__ = [ 'name', 'start' ]
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+
+        return self
+
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start)
+
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def pooled(job):
+    # Runs in a pool worker, which starts with its own copy of the state,
+    # and hands back what the job recorded along with its result
+
+    global enabled
+
+    func, arg, enabled = job
+    reset()
+
+    try:
+        return func(arg), dict(timers), dict(counters)
+    finally:
+        enabled = False
+
+
+def merge(job_timers, job_counters):
+    for name, (calls, seconds) in job_timers.items():
+        timer = timers[name]
+        timer[0] += calls
+        timer[1] += seconds
+
+    for name, n in job_counters.items():
+        counters[name] += n
+
+
+def pool_map(pool, func, work):
+    # pool.map that keeps the workers' stages and counters; their seconds
+    # add up across processes, so stages can exceed the wall time
+
+    for result, job_timers, job_counters in pool.map(pooled, [ (func, arg, enabled) for arg in work ]):
+        merge(job_timers, job_counters)
+        yield result
+
+
+def stage_table():
+    from prettytable import PrettyTable
+
+    table = PrettyTable([ 'stage', 'calls', 'seconds', 'per call' ])
+    table.align['stage'] = 'l'
+
+    for column in [ 'calls', 'seconds', 'per call' ]:
+        table.align[column] = 'r'
+
+    for name, (calls, seconds) in sorted(timers.items(), key=lambda t: -t[1][1]):
+        table.add_row([ name, calls, '{:.6f}'.format(seconds), '{:.6f}'.format(seconds / calls) ])
+
+    return table
+
+
+def counter_table():
+    from prettytable import PrettyTable
+
+    table = PrettyTable([ 'counter', 'count' ])
+    table.align['counter'] = 'l'
+    table.align['count'] = 'r'
+
+    for name, n in sorted(counters.items()):
+        table.add_row([ name, n ])
+
+    return table
+
+
+def profile_call(name, func, *args, **kwargs):
+    global enabled
+
+    reset()
+    enabled = True
+
+    profiler = cProfile.Profile()
+
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        enabled = False
+
+        PROFILES.mkdir(exist_ok=True)
+        path = PROFILES / '{}.pstats'.format(name)
+        profiler.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+
+        print(out.getvalue())
+        print(stage_table())
+
+        if counters:
+            print(counter_table())
+
+        print('profile', path)
+
+
+def profiled(func):
+    # Adds a profile=False argument; invoke reads __signature__ through
+    # inspect.signature, so every wrapped task grows a --profile flag
+
+    signature = inspect.signature(func)
+    profile = inspect.Parameter('profile', inspect.Parameter.POSITIONAL_OR_KEYWORD, default=False)
+
+    @functools.wraps(func)
+    def wrapper(*args, profile=False, **kwargs):
+        if not profile:
+            return func(*args, **kwargs)
+
+        return profile_call(func.__name__, func, *args, **kwargs)
+
+    wrapper.__signature__ = signature.replace(parameters=[ *signature.parameters.values(), profile ])
+
+    return wrapper
@@ -0,0 +1,121 @@
+import numpy as np
+
+from date import (
+    align_to_days,
+    as_days,
+    end_of_broadcast_month_array,
+    end_of_month_array,
+    end_of_week_array,
+    start_of_broadcast_month_array,
+    start_of_month_array,
+    start_of_week_array,
+)
+
+# period : (start of period, end of period) over datetime64[D] arrays
+windows = {
+    'day'             : (as_days, as_days),
+    'week'            : (start_of_week_array, end_of_week_array),
+    'month'           : (start_of_month_array, end_of_month_array),
+    'broadcast_month' : (start_of_broadcast_month_array, end_of_broadcast_month_array),
+}
+
+
+def day_numbers(d):
+    return as_days(d).astype(np.int64)
+
+
+class IntervalIndex:
+    def __init__(self, starts, ends, amounts):
+        starts, ends = day_numbers(starts), day_numbers(ends)
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        self.order = np.argsort(starts, kind='stable')
+
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.amounts = amounts[self.order]
+        self.lengths = self.ends - self.starts + 1
+
+        # Running maximum of the ends lets a query skip every interval sorted
+        # before the first one that could still reach it
+        self.reach = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+        # Amounts are spread evenly over their days, so the total up to any
+        # day is piecewise linear with breaks at starts and ends
+        rates = self.amounts / self.lengths
+
+        points = np.concatenate((self.starts, self.ends + 1))
+        changes = np.concatenate((rates, -rates))
+
+        self.points, inverse = np.unique(points, return_inverse=True)
+        self.slopes = np.cumsum(np.bincount(inverse, weights=changes, minlength=len(self.points)))
+
+        widths = np.diff(self.points)
+        self.cumulative = np.concatenate(([ 0. ], np.cumsum(self.slopes[:-1] * widths)))
+
+        # Indexes are memoized and shared between callers, so every query
+        # array is read-only
+        for a in (self.order, self.starts, self.ends, self.amounts, self.lengths,
+                  self.reach, self.points, self.slopes, self.cumulative):
+            a.flags.writeable = False
+
+
+    def __len__(self):
+        return len(self.starts)
+
+
+    def total_before(self, days):
+        k = np.searchsorted(self.points, days, side='right') - 1
+        valid = k >= 0
+        k = np.maximum(k, 0)
+
+        totals = self.cumulative[k] + self.slopes[k] * (days - self.points[k])
+
+        return np.where(valid, totals, 0.)
+
+
+    def amount(self, from_date, to_date):
+        if not len(self):
+            return np.zeros(np.shape(as_days(from_date)))
+
+        a, b = day_numbers(from_date), day_numbers(to_date)
+        return self.total_before(b + 1) - self.total_before(a)
+
+
+    def amount_in(self, d, align=align_to_days):
+        from_date, to_date = align(d, d)
+        return float(self.amount(from_date, to_date))
+
+
+    def amounts_in(self, days, period='day'):
+        start_of, end_of = windows[period]
+        return self.amount(start_of(days), end_of(days))
+
+
+    def positions(self, from_date, to_date):
+        a, b = int(day_numbers(from_date)), int(day_numbers(to_date))
+
+        first = np.searchsorted(self.reach, a, side='left')
+        last = np.searchsorted(self.starts, b, side='right')
+
+        candidates = np.arange(first, last)
+
+        return candidates[self.ends[candidates] >= a], a, b
+
+
+    def overlapping(self, from_date, to_date):
+        positions, _, _ = self.positions(from_date, to_date)
+        return self.order[positions]
+
+
+    def covering(self, d):
+        return self.overlapping(d, d)
+
+
+    def prorated(self, from_date, to_date):
+        positions, a, b = self.positions(from_date, to_date)
+
+        days = np.minimum(self.ends[positions], b) - np.maximum(self.starts[positions], a) + 1
+        amounts = self.amounts[positions] * days / self.lengths[positions]
+
+        return self.order[positions], amounts
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_RUNS = 10000
+
+Bands = namedtuple('Bands', [ 'percentiles', 'monthly', 'cumulative' ])
+
+
+def sample_phases(rng, runs, months, durations):
+    # Months spent in each phase before moving on, phase 3 lasts forever
+
+    boundaries = np.zeros((runs, 1), dtype=np.int64)
+    index = np.arange(months)
+    phases = np.zeros((runs, months), dtype=np.int64)
+
+    for phase in sorted(durations):
+        choices = np.asarray(list(durations[phase]), dtype=np.int64)
+        boundaries = boundaries + rng.choice(choices, size=(runs, 1))
+        phases += index >= boundaries
+
+    return phases
+
+
+def simulate_chunk(seed, runs, durations, net_by_phase):
+    rng = np.random.default_rng(seed)
+    months = net_by_phase.shape[1]
+
+    phases = sample_phases(rng, runs, months, durations)
+    monthly = net_by_phase[phases, np.arange(months)]
+
+    return monthly
+
+
+def simulate(net_by_phase, durations, runs, seed=0, jobs=None):
+    if runs < 1:
+        raise ValueError('runs must be at least 1. runs = {}'.format(runs))
+
+    chunks = [ CHUNK_RUNS ] * (runs // CHUNK_RUNS)
+
+    if runs % CHUNK_RUNS:
+        chunks.append(runs % CHUNK_RUNS)
+
+    # One child seed per chunk, so results don't depend on the job count
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    jobs = jobs or os.cpu_count()
+    args = (seeds, chunks, [ durations ] * len(chunks), [ net_by_phase ] * len(chunks))
+
+    if jobs == 1 or len(chunks) == 1:
+        results = list(map(simulate_chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(simulate_chunk, *args))
+
+    return np.concatenate(results)
+
+
+def percentile_bands(monthly, percentiles=(5, 25, 50, 75, 95)):
+    cumulative = np.cumsum(monthly, axis=1)
+
+    return Bands(
+        list(percentiles),
+        np.percentile(monthly, percentiles, axis=0),
+        np.percentile(cumulative, percentiles, axis=0),
+    )
@@ -0,0 +1,103 @@
+import numpy as np
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class ProfitLoss(Mapping):
+    def __init__(self, categories, months, values):
+        # Labels never change after construction, so freeze() only has the
+        # values left to lock
+        self.categories = tuple(categories)
+        self.months = tuple(months)
+        self.values = np.asarray(values, dtype=np.float64)
+
+        self.category_index = MappingProxyType({ c : i for i, c in enumerate(self.categories) })
+        self.month_index = MappingProxyType({ m : j for j, m in enumerate(self.months) })
+
+
+    @classmethod
+    def from_psv(cls, matrix):
+        months = matrix.columns.tolist()
+        columns = [ j for j, m in enumerate(months) if m is not None ]
+
+        # Later rows win for repeated categories, as in the dict view
+        rows = { c : i for i, c in enumerate(matrix.rows.tolist()) }
+
+        values = matrix.values[np.ix_(list(rows.values()), columns)]
+
+        return cls(rows.keys(), [ months[j] for j in columns ], values)
+
+
+    def freeze(self):
+        self.values.flags.writeable = False
+        return self
+
+
+    def copy(self):
+        return type(self)(self.categories, self.months, self.values.copy())
+
+
+    def index(self, key):
+        category, month = key
+        return self.category_index[category], self.month_index[month]
+
+
+    def __getitem__(self, key):
+        return self.values[self.index(key)].item()
+
+
+    def __setitem__(self, key, value):
+        self.values[self.index(key)] = value
+
+
+    def __iter__(self):
+        for c in self.categories:
+            for m in self.months:
+                yield (c, m)
+
+
+    def __len__(self):
+        return self.values.size
+
+
+    def items(self):
+        return zip(iter(self), self.values.ravel().tolist())
+
+
+    def row(self, category):
+        return self.values[self.category_index[category]]
+
+
+    def column(self, month):
+        return self.values[:, self.month_index[month]]
+
+
+    def rows(self, categories):
+        return self.values[[ self.category_index[c] for c in categories ]]
+
+
+    def select(self, categories=None, months=None):
+        if categories is None:
+            categories = self.categories
+        else:
+            categories = [ c for c in self.categories if c in categories ]
+
+        if months is None:
+            months = self.months
+        else:
+            months = [ m for m in self.months if m in months ]
+
+        i = [ self.category_index[c] for c in categories ]
+        j = [ self.month_index[m] for m in months ]
+
+        return type(self)(categories, months, self.values[np.ix_(i, j)])
+
+
+    def category_totals(self):
+        return dict(zip(self.categories, self.values.sum(axis=1).tolist()))
+
+
+    def month_totals(self, categories=None):
+        values = self.values if categories is None else self.rows(categories)
+        return dict(zip(self.months, values.sum(axis=0).tolist()))
@@ -0,0 +1,148 @@
+import mmap
+
+import numpy as np
+
+from pathlib import Path
+from columnar import to_dates
+
+SEPARATOR = ord('|')
+NEWLINE = ord('\n')
+COMMA = ord(',')
+WHITESPACE = np.array([ ord(c) for c in ' \t\r\n\f\v' ], dtype=np.uint8)
+
+
+class PSVMatrix:
+    def __init__(self, rows, columns, values):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+
+
+    def to_arrays(self):
+        return {
+            'rows'    : self.rows,
+            'columns' : self.columns,
+            'values'  : self.values,
+        }
+
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['rows'], arrays['columns'], arrays['values'])
+
+
+    def records(self, filter=None):
+        columns = [ (i, d) for i, d in enumerate(self.columns.tolist()) if d is not None ]
+        values = self.values.tolist()
+
+        records = { }
+
+        for row, label in enumerate(self.rows.tolist()):
+            if filter and label not in filter:
+                continue
+
+            for i, d in columns:
+                records[(label, d)] = values[row][i]
+
+        return records
+
+
+def split_lines(buf):
+    ends = np.flatnonzero(buf == NEWLINE)
+
+    if not len(ends) or ends[-1] != len(buf) - 1:
+        ends = np.append(ends, len(buf))
+
+    starts = np.concatenate(([ 0 ], ends[:-1] + 1))
+
+    return starts, ends
+
+
+def line_bytes(starts, ends):
+    # Positions of every byte in the given lines, without a Python loop
+
+    lengths = ends - starts
+    owners = np.repeat(np.arange(len(starts)), lengths)
+
+    return owners, np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[owners]
+
+
+def parse_matrix(buf):
+    starts, ends = split_lines(buf)
+
+    header = bytes(buf[starts[0]:ends[0]]).decode().split('|')
+    header = [ h.strip() for h in header ]
+
+    separators = np.flatnonzero(buf == SEPARATOR)
+    first = np.searchsorted(separators, starts)
+    counts = np.searchsorted(separators, ends) - first
+
+    # Only lines without a separator can be blank, so just their bytes are
+    # tested for whitespace
+
+    bare = np.flatnonzero(counts == 0)
+    owners, positions = line_bytes(starts[bare], ends[bare])
+    solid = np.bincount(owners, weights=~np.isin(buf[positions], WHITESPACE), minlength=len(bare))
+
+    body = np.ones(len(starts), dtype=bool)
+    body[bare[solid == 0]] = False
+    body[0] = False
+
+    starts, ends, first, counts = starts[body], ends[body], first[body], counts[body]
+
+    if np.any(counts != len(header) - 1):
+        raise ValueError('ragged rows')
+
+    first = separators[first]
+
+    rows = np.array([ bytes(buf[s:e]).decode().strip() for s, e in zip(starts, first) ])
+
+    # Select the numeric block of every line, newline included, with int8
+    # marks so the mask costs two bytes per input byte
+
+    marks = np.zeros(len(buf) + 2, dtype=np.int8)
+    marks[first + 1] = 1
+    marks[ends + 1] = -1
+
+    block = buf[np.cumsum(marks[:len(buf)], dtype=np.int8).view(bool)]
+    block = block[block != COMMA]
+    block = np.where(block == NEWLINE, SEPARATOR, block).astype(np.uint8)
+
+    cells = bytes(block).split(b'|')[:len(rows) * (len(header) - 1)]
+    cells = np.char.strip(np.array(cells, dtype=bytes))
+    cells = np.where(cells == b'', b'nan', cells)
+
+    values = cells.astype(np.float64).reshape(len(rows), len(header) - 1)
+
+    return rows, header[1:], values
+
+
+def read_psv(path):
+    path = Path(path)
+
+    # mmap refuses empty files, and without a header there is nothing to read
+    if not path.stat().st_size:
+        raise ValueError('no header in {}'.format(path))
+
+    # The error is raised after the map is closed, since its traceback
+    # would keep views of the buffer alive and mmap refuses to close then
+    error = None
+
+    with path.open('rb') as fd:
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+
+            try:
+                rows, columns, values = parse_matrix(buf)
+            except ValueError as e:
+                error = str(e)
+            finally:
+                del buf
+
+    if error is not None:
+        raise ValueError('{} in {}'.format(error, path))
+
+    # Header cells that are not months are kept as None columns
+    columns = to_dates(np.array(columns), errors='coerce')
+
+    return PSVMatrix(rows, columns, values)
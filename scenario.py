@@ -0,0 +1,160 @@
+import numpy as np
+
+from collections import namedtuple
+from types import MappingProxyType
+
+Assumptions = namedtuple('Assumptions',
+    [
+        'reference',
+        'totals',
+        'phase_percentages',
+        'rent_schedule',
+        'weekly_payroll',
+    ]
+)
+
+scenario_items = [
+    'phase',
+    'bar sales',
+    'bar costs',
+    'food sales',
+    'food costs',
+    'lottery commission',
+    'rent',
+    'utilities',
+    'payroll - regular wages',
+    'taxes - payroll',
+    'entertainment',
+    'over - lottery',
+    'over - bar',
+    'gross',
+    'costs',
+    'net',
+]
+
+
+class ScenarioCube:
+    def __init__(self, models, months, items, values):
+        self.models = tuple(models)
+        self.months = tuple(months)
+        self.items = tuple(items)
+        self.values = values
+
+        self.model_index = MappingProxyType({ m : i for i, m in enumerate(self.models) })
+        self.month_index = MappingProxyType({ m : j for j, m in enumerate(self.months) })
+        self.item_index = MappingProxyType({ k : i for i, k in enumerate(self.items) })
+
+
+    def item(self, name):
+        return self.values[:, :, self.item_index[name]]
+
+
+    def model(self, name):
+        return self.values[self.model_index[name]]
+
+
+def phase_matrix(by_model):
+    names = list(by_model)
+    months = sorted({ m for phases in by_model.values() for m in phases })
+
+    phases = np.array([
+        [ by_model[name][m] for m in months ]
+        for name in names
+    ], dtype=np.int64)
+
+    return names, months, phases
+
+
+def month_array(months):
+    return np.array(months, dtype='datetime64[M]')
+
+
+def percentages(phases, assumptions):
+    table = assumptions.phase_percentages
+
+    valid = np.isin(phases, list(table))
+
+    if not valid.all():
+        raise ValueError('phase not valid. phase = {}'.format(phases[~valid][0]))
+
+    lookup = np.zeros(max(table) + 1)
+
+    for phase, percentage in table.items():
+        lookup[phase] = percentage
+
+    return lookup[phases]
+
+
+def rent(months, assumptions):
+    months = month_array(months)
+
+    until = [ months <= np.datetime64(m, 'M') for m, _ in assumptions.rent_schedule ]
+    amounts = [ amount for _, amount in assumptions.rent_schedule ]
+
+    return np.select(until, amounts, default=np.nan)
+
+
+def weeks_in_month(months):
+    months = month_array(months)
+    days = (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+
+    return days.astype(np.int64) / 7.
+
+
+def evaluate(models, months, phases, assumptions):
+    totals = assumptions.totals
+    phases = np.asarray(phases)
+
+    month_of_year = month_array(months).astype(np.int64) % 12
+    percentage = percentages(phases, assumptions)
+
+    opened = phases != 0
+
+    items = { }
+    items['phase'] = phases.astype(np.float64)
+
+    items['bar sales'] = percentage * assumptions.reference['bar sales'][month_of_year]
+    items['bar costs'] = (totals['bar purchases'] / totals['bar sales']) * items['bar sales']
+
+    items['food sales'] = percentage * assumptions.reference['food sales'][month_of_year]
+    items['food costs'] = (totals['food purchases'] / totals['food sales']) * items['food sales']
+
+    items['lottery commission'] = np.where(opened, totals['lottery commission'] / 12, 0.)
+
+    items['rent'] = np.broadcast_to(rent(months, assumptions), phases.shape)
+    items['utilities'] = np.full(phases.shape, totals['utilities'] / 12)
+
+    weekly = sum(assumptions.weekly_payroll.values())
+    payroll = 0. - weeks_in_month(months) * weekly
+    items['payroll - regular wages'] = np.where(opened, payroll, 0.)
+
+    ratio = totals['taxes - payroll'] / totals['payroll - regular wages']
+    items['taxes - payroll'] = ratio * items['payroll - regular wages']
+
+    average = totals['entertainment'] / 12
+    items['entertainment'] = np.select([ phases == 2, phases == 3 ], [ average / 2, average ], 0.)
+
+    items['over - lottery'] = np.zeros(phases.shape)
+    items['over - bar'] = np.zeros(phases.shape)
+
+    items['gross'] = (
+        items['bar sales']
+        + items['food sales']
+        + items['lottery commission']
+    )
+
+    items['costs'] = (
+        items['bar costs']
+        + items['food costs']
+        + items['rent']
+        + items['utilities']
+        + items['payroll - regular wages']
+        + items['taxes - payroll']
+        + items['entertainment']
+    )
+
+    items['net'] = items['gross'] + items['costs']
+
+    values = np.stack([ items[k] for k in scenario_items ], axis=-1)
+
+    return ScenarioCube(models, months, scenario_items, values)
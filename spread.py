@@ -0,0 +1,66 @@
+import numpy as np
+
+from date import as_days
+
+
+def spread_days(start, end, values):
+    start = np.asarray(start, dtype='datetime64[D]')
+    end = np.asarray(end, dtype='datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+
+    lengths = (end - start).astype(np.int64) + 1
+    lengths = np.maximum(lengths, 0)
+
+    parents = np.repeat(np.arange(len(start)), lengths)
+
+    # Offset of every generated day from the start of its parent range
+    firsts = np.cumsum(lengths) - lengths
+    offsets = np.arange(len(parents)) - firsts[parents]
+
+    days = start[parents] + offsets
+    amounts = (values / np.where(lengths, lengths, 1))[parents]
+
+    return parents, days, amounts
+
+
+def sum_by_period(start, end, values, period):
+    _, days, amounts = spread_days(start, end, values)
+
+    keys, inverse = np.unique(period(days), return_inverse=True)
+
+    return keys, np.bincount(inverse, weights=amounts, minlength=len(keys))
+
+
+def sum_by_day(start, end, values):
+    return sum_by_period(start, end, values, as_days)
+
+
+def sum_by_month(start, end, values):
+    start = np.asarray(start, dtype='datetime64[D]')
+    end = np.asarray(end, dtype='datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+
+    lengths = (end - start).astype(np.int64) + 1
+    rates = values / np.where(lengths > 0, lengths, 1)
+
+    first_month = start.astype('datetime64[M]')
+    last_month = end.astype('datetime64[M]')
+
+    counts = (last_month - first_month).astype(np.int64) + 1
+    counts = np.where(lengths > 0, counts, 0)
+
+    # One fragment per (range, month) pair instead of one per day
+
+    parents = np.repeat(np.arange(len(start)), counts)
+    firsts = np.cumsum(counts) - counts
+    months = first_month[parents] + (np.arange(len(parents)) - firsts[parents])
+
+    month_start = np.maximum(months.astype('datetime64[D]'), start[parents])
+    month_end = np.minimum((months + 1).astype('datetime64[D]') - 1, end[parents])
+
+    days = (month_end - month_start).astype(np.int64) + 1
+    amounts = rates[parents] * days
+
+    keys, inverse = np.unique(months, return_inverse=True)
+
+    return keys, np.bincount(inverse, weights=amounts, minlength=len(keys))
@@ -0,0 +1,111 @@
+from collections import namedtuple
+from pathlib import Path
+
+Partition = namedtuple('Partition', [ 'location', 'year', 'directory' ])
+
+# A blend of reference years, as sorted (year, weight) pairs, over the
+# summed data of one or more locations
+Reference = namedtuple('Reference', [ 'locations', 'weights' ])
+
+
+def reference(years, locations):
+    if isinstance(years, int):
+        weights = { years : 1. }
+    elif isinstance(years, dict):
+        weights = years
+    else:
+        years = list(years)
+        weights = { y : 1 / len(years) for y in years }
+
+    if not weights:
+        raise ValueError('reference needs at least one year')
+
+    if isinstance(locations, str):
+        locations = [ locations ]
+
+    return Reference(tuple(sorted(locations)), tuple(sorted(weights.items())))
+
+
+def parse_reference(text, locations):
+    # '2019', '2018,2019' or '2018:0.25,2019:0.75'
+
+    weights = { }
+
+    for part in text.split(','):
+        year, _, weight = (p.strip() for p in part.partition(':'))
+        weights[int(year)] = float(weight) if weight else None
+
+    if None in weights.values():
+        if any(w is not None for w in weights.values()):
+            raise ValueError('weight every year or none of them. reference = {}'.format(text))
+
+        return reference(list(weights), locations)
+
+    return reference(weights, locations)
+
+
+class Store:
+    def __init__(self, partitions=()):
+        self.partitions = { }
+
+        for p in partitions:
+            self.add(*p)
+
+
+    @classmethod
+    def scan(cls, root):
+        # root/<location>/<year>/ holds that venue's files for that year
+
+        root = Path(root)
+        store = cls()
+
+        if not root.is_dir():
+            return store
+
+        for location in sorted(root.iterdir()):
+            if not location.is_dir():
+                continue
+
+            for year in sorted(location.iterdir()):
+                if year.is_dir() and year.name.isdigit():
+                    store.add(location.name, int(year.name), year)
+
+        return store
+
+
+    def add(self, location, year, directory):
+        self.partitions[(location, year)] = Partition(location, year, Path(directory))
+
+
+    def __len__(self):
+        return len(self.partitions)
+
+
+    def __iter__(self):
+        return iter(sorted(self.partitions.values()))
+
+
+    def select(self, locations=None, years=None):
+        # Pruning happens on the (location, year) keys alone, so partitions
+        # outside the query are never opened
+
+        if locations is not None:
+            locations = set(locations)
+
+        if years is not None:
+            years = set(years)
+
+        return [
+            self.partitions[key]
+            for key in sorted(self.partitions)
+            if (locations is None or key[0] in locations)
+            and (years is None or key[1] in years)
+        ]
+
+
+    def files(self, name, locations=None, years=None):
+        return [
+            (p, p.directory / name)
+            for p in self.select(locations, years)
+            if (p.directory / name).exists()
+        ]
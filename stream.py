@@ -0,0 +1,149 @@
+import heapq
+import tempfile
+
+from collections import namedtuple
+from datetime import date
+from pathlib import Path
+
+from date import (
+    date_inc,
+    end_of_broadcast_month,
+    end_of_month,
+    end_of_week,
+    segment_to_broadcast_month,
+    segment_to_date_period,
+    segment_to_month,
+    segment_to_week,
+    start_of_broadcast_month,
+    start_of_month,
+    start_of_week,
+)
+
+RevenueRow = namedtuple('RevenueRow', [ 'start_date', 'end_date', 'type', 'revenue' ])
+
+
+def segment_to_days(from_date, to_date):
+    return segment_to_date_period(date_inc, from_date, to_date)
+
+
+def identity(x):
+    return x
+
+
+# period : (segment, start of period, end of period)
+periods = {
+    'day'             : (segment_to_days, identity, identity),
+    'week'            : (segment_to_week, start_of_week, end_of_week),
+    'month'           : (segment_to_month, start_of_month, end_of_month),
+    'broadcast_month' : (segment_to_broadcast_month, start_of_broadcast_month, end_of_broadcast_month),
+}
+
+
+def parse_day(text):
+    text = text.strip()
+
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        import dateutil.parser as parser
+        return parser.parse(text).date()
+
+
+def read_revenue_rows(path):
+    with Path(path).open() as fd:
+        header = [ h.strip() for h in next(fd).split(',') ]
+
+        for line in fd:
+            if not line.strip():
+                continue
+
+            record = dict(zip(header, line.split(',')))
+
+            yield RevenueRow(
+                parse_day(record['start_date']),
+                parse_day(record['end_date']),
+                record['type'].strip(),
+                float(record['revenue']),
+            )
+
+
+def write_run(directory, rows):
+    rows.sort()
+
+    fd = tempfile.NamedTemporaryFile('w', dir=directory, suffix='.csv', delete=False)
+
+    with fd:
+        for r in rows:
+            fd.write('{},{},{},{!r}\n'.format(r.start_date, r.end_date, r.type, r.revenue))
+
+    return fd.name
+
+
+def read_run(path):
+    with open(path) as fd:
+        for line in fd:
+            start, end, type, revenue = line.rstrip('\n').split(',')
+
+            yield RevenueRow(
+                date.fromisoformat(start),
+                date.fromisoformat(end),
+                type,
+                float(revenue),
+            )
+
+
+def external_sort(rows, chunk_rows=100000):
+    # Sort runs of chunk_rows in memory, spill them to disk and merge lazily
+
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [ ]
+        chunk = [ ]
+
+        for row in rows:
+            chunk.append(row)
+
+            if len(chunk) >= chunk_rows:
+                runs.append(write_run(directory, chunk))
+                chunk = [ ]
+
+        if not runs:
+            yield from sorted(chunk)
+            return
+
+        if chunk:
+            runs.append(write_run(directory, chunk))
+
+        yield from heapq.merge(*map(read_run, runs))
+
+
+def stream_totals(rows, period='month', type='total'):
+    segment, start_of_period, end_of_period = periods[period]
+
+    totals = { }
+    emitted = None
+
+    def flush(before):
+        for key in sorted(k for k in totals if before is None or end_of_period(k) < before):
+            yield key, totals.pop(key)
+
+    for row in rows:
+        if type is not None and row.type != type:
+            continue
+
+        if emitted is not None and row.start_date <= emitted:
+            raise ValueError('input is not sorted by start_date: {}'.format(row))
+
+        # Every period ending before this row starts can no longer change
+
+        for key, total in flush(row.start_date):
+            emitted = end_of_period(key)
+            yield key, total
+
+        days = (row.end_date - row.start_date).days + 1
+        rate = row.revenue / days
+
+        for start, end in segment(row.start_date, row.end_date):
+            key = start_of_period(start)
+            totals[key] = totals.get(key, 0.) + rate * ((end - start).days + 1)
+
+    yield from flush(None)
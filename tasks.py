@@ -1,23 +1,73 @@
 import invoke
+import numpy as np
 
 from pathlib import Path
 from datetime import date, datetime, timedelta
-from date import months_in_range, month_inc
+from date import (
+    align_to_broadcast_months,
+    align_to_days,
+    align_to_months,
+    align_to_weeks,
+    as_days,
+    calendar_table,
+    month_inc,
+    month_periods,
+)
+from columnar import Columns, read_columns
+from psv import PSVMatrix, read_psv
+from profit_loss import ProfitLoss
+from corrections import compile_rules, read_rules
+from scenario import Assumptions, evaluate, phase_matrix
+from monte_carlo import percentile_bands, simulate
+from cache import clear_cache, disk_cache
+from spread import spread_days, sum_by_day, sum_by_month, sum_by_period
+from stream import external_sort, read_revenue_rows, stream_totals
+from intervals import IntervalIndex
+from instrument import count, pool_map, profiled, stage, timed
+from store import Store, parse_reference, reference
 
 from collections import defaultdict, namedtuple
-
-from groupby import sum_groupby
+from concurrent.futures import ProcessPoolExecutor
 
 from pprint import pprint
 from prettytable import PrettyTable
 
 import functools
+import os
+
+from types import MappingProxyType
+
+memoized = [ ]
+
+def memoize(func):
+    cached = functools.lru_cache()(func)
+    memoized.append(cached)
+
+    return cached
+
+
+def cache_stats():
+    return { f.__name__ : f.cache_info() for f in memoized }
+
+
+def invalidate_caches(disk=False):
+    for f in memoized:
+        f.cache_clear()
+
+    if disk:
+        clear_cache(CACHE)
+
 
-memoize = functools.lru_cache()
+def task(func):
+    return invoke.task(profiled(func))
 
 FILE = Path(__file__)
 HERE = FILE.parent
 DATA = HERE / 'data'
+CACHE = DATA / '.cache'
+LOCATIONS = DATA / 'locations'
+
+disk_memoize = functools.partial(disk_cache, CACHE)
 
 def identity(x):
     return x
@@ -46,6 +96,10 @@ def fmt_float(f):
     return '{: 2.02f}'.format(f)
 
 
+def fmt_floats(values):
+    return list(map('{: 2.02f}'.format, values.tolist()))
+
+
 def fmt_value(v):
     if isinstance(v, date):
         return fmt_month(v)
@@ -77,34 +131,52 @@ def read_csv(path):
         for line in fd:
             yield { h : csv_converters[h](v) for h, v in zip(header, line.split(',')) }
 
-RevenueRecord = namedtuple('RevenueRecord', [ 'type', 'date', 'revenue' ])
+@timed('load_columns')
+@disk_memoize(Columns)
+def load_columns(path):
+    return read_columns(path)
+
+
+@task
+def clear_data_cache(context):
+    clear_cache(CACHE)
+
+
+@task
+def print_cache_stats(context):
+    table = PrettyTable([ 'function', 'hits', 'misses', 'size' ])
+
+    for name, info in sorted(cache_stats().items()):
+        table.add_row([ name, info.hits, info.misses, info.currsize ])
+
+    print(table)
 
-ONE_DAY = timedelta(1)
+
+RevenueRecord = namedtuple('RevenueRecord', [ 'type', 'date', 'revenue' ])
 
 def revenue_records(path):
-    for record in read_csv(path):
-        current = record['start_date']
-        end_date = record['end_date']
+    return table_revenue_records(load_columns(path))
+
 
-        delta = (end_date - current) + ONE_DAY
-        delta = delta.total_seconds() / ONE_DAY.total_seconds()
+def table_revenue_records(table):
+    parents, days, amounts = spread_days(
+        table['start_date'],
+        table['end_date'],
+        table['revenue'],
+    )
 
-        while current <= end_date:
-            yield RevenueRecord(
-                record['type'],
-                current,
-                record['revenue'] / delta,
-            )
+    types = table.labels('type')[parents]
 
-            current += ONE_DAY
+    for record in zip(types.tolist(), days.tolist(), amounts.tolist()):
+        yield RevenueRecord(*record)
 
-@invoke.task
-def print_total_revenue(context):
-    total = 0.
 
-    for r in revenue_records(DATA / 'revenue.csv'):
-        total += r.revenue
+@task
+def print_total_revenue(context):
+    table = load_columns(DATA / 'revenue.csv')
 
+    _, amounts = sum_by_day(table['start_date'], table['end_date'], table['revenue'])
+    total = amounts.sum()
 
     print('total', total)
     
@@ -114,22 +186,34 @@ def month_of(d):
     return date(d.year, d.month, 1)
 
 
+@timed('revenue_by_day')
 def revenue_by_day(path, type='total'):
-    return {
-        r.date : r.revenue
-        for r in revenue_records(path)
-        if r.type == type
-    }
+    table = load_columns(path)
+    rows = table.labels('type') == type
+
+    days, amounts = sum_by_day(
+        table['start_date'][rows],
+        table['end_date'][rows],
+        table['revenue'][rows],
+    )
 
+    return dict(zip(days.tolist(), amounts.tolist()))
 
+
+@timed('revenue_by_month')
 def revenue_by_month(path):
-    return sum_groupby(
-        (month_of(record.date), record.revenue)
-        for record in revenue_records(path)
+    table = load_columns(path)
+
+    months, amounts = sum_by_month(
+        table['start_date'],
+        table['end_date'],
+        table['revenue'],
     )
 
+    return dict(zip(months.astype('datetime64[D]').tolist(), amounts.tolist()))
 
-@invoke.task
+
+@task
 def print_revenue_by_day(context):
     by_day = revenue_by_day(DATA / 'revenue.csv')
 
@@ -138,11 +222,65 @@ def print_revenue_by_day(context):
         break
 
 
-@invoke.task
+@task
 def print_revenue_by_month(context):
     pprint(revenue_by_month(DATA / 'revenue.csv'))
 
 
+@memoize
+def calendar():
+    return calendar_table(directory=CACHE)
+
+
+def calendar_period(name):
+    return lambda d: getattr(calendar(), name)(d)
+
+
+revenue_periods = {
+    'day'             : as_days,
+    'week'            : calendar_period('start_of_week'),
+    'month'           : calendar_period('start_of_month'),
+    'broadcast_month' : calendar_period('start_of_broadcast_month'),
+}
+
+
+@timed('revenue_by_period')
+def revenue_by_period(path, period, type='total'):
+    table = load_columns(path)
+    rows = table.labels('type') == type
+
+    keys, amounts = sum_by_period(
+        table['start_date'][rows],
+        table['end_date'][rows],
+        table['revenue'][rows],
+        revenue_periods[period],
+    )
+
+    return dict(zip(keys.tolist(), amounts.tolist()))
+
+
+@task
+def print_revenue_by_period(context, period='week', type='total'):
+    table = PrettyTable([ period, 'revenue' ])
+    table.align['revenue'] = 'r'
+
+    for key, total in revenue_by_period(DATA / 'revenue.csv', period, type).items():
+        table.add_row([ key, fmt_float(total) ])
+
+    print(table)
+
+
+@task
+def stream_revenue(context, period='month', type='total', path=None, presorted=False, chunk=100000):
+    rows = read_revenue_rows(path or DATA / 'revenue.csv')
+
+    if not presorted:
+        rows = external_sort(rows, chunk)
+
+    for key, total in stream_totals(rows, period, type or None):
+        print(key, fmt_float(total), sep='\t', flush=True)
+
+
 PayrollRecord = namedtuple('PayrollRecord',
     [
         'start_date', 'end_date',
@@ -151,24 +289,63 @@ PayrollRecord = namedtuple('PayrollRecord',
     ]
 )
 
+@timed('payroll_records')
 def payroll_records(path):
-    for record in read_csv(path):
-        yield PayrollRecord(**record)
+    return load_columns(path).records(PayrollRecord)
 
 
+@timed('payroll_by_role')
 def payroll_by_role(path):
-    return sum_groupby(
-        (r.role, r.total) for r in payroll_records(path)
-    )
+    return load_columns(path).sum_by('role', 'total')
+
+
+@memoize
+def revenue_index(type='total'):
+    table = load_columns(DATA / 'revenue.csv')
+    rows = table.labels('type') == type
+
+    return IntervalIndex(table['start_date'][rows], table['end_date'][rows], table['revenue'][rows])
+
+
+@memoize
+def payroll_index():
+    table = load_columns(DATA / 'payroll.csv')
+    return IntervalIndex(table['start_date'], table['end_date'], table['total'])
+
+
+alignments = {
+    'day'             : align_to_days,
+    'week'            : align_to_weeks,
+    'month'           : align_to_months,
+    'broadcast_month' : align_to_broadcast_months,
+}
 
 
-@invoke.task
+@task
+def print_period_coverage(context, day, period='broadcast_month'):
+    day = parse_date(day)
+    align = alignments[period]
+
+    start, end = align(day, day)
+
+    table = PrettyTable([ '', 'value' ])
+    table.align['value'] = 'r'
+
+    table.add_row([ 'from', start ])
+    table.add_row([ 'to', end ])
+    table.add_row([ 'revenue', fmt_float(revenue_index().amount_in(day, align)) ])
+    table.add_row([ 'lottery', fmt_float(revenue_index('lottery').amount_in(day, align)) ])
+    table.add_row([ 'payroll', fmt_float(payroll_index().amount_in(day, align)) ])
+
+    print(table)
+
+
+@task
 def model_raise(context):
-    by_person = sum_groupby(
-        # (r.name, r.hours * 20) if r.name == 'calvin' else (r.name, r.hours * 15)
-        (r.name, r.hours * 15)
-        for r in payroll_records(DATA / 'payroll.csv')
-    )
+    payroll = load_columns(DATA / 'payroll.csv')
+
+    # payroll.sum_by('name', np.where(payroll.labels('name') == 'calvin', 20, 15) * payroll['hours'])
+    by_person = payroll.sum_by('name', payroll['hours'] * 15)
 
     table = PrettyTable(['name', 'total'])
     for r in sorted(by_person.items()):
@@ -179,11 +356,8 @@ def model_raise(context):
     print()
 
 
-    by_role = sum_groupby(
-        (r.role, r.hours * 15)
-        # (r.role, r.hours * 20) if r.name == 'calvin' else (r.role, r.hours * 15)
-        for r in payroll_records(DATA / 'payroll.csv')
-    )
+    # payroll.sum_by('role', np.where(payroll.labels('name') == 'calvin', 20, 15) * payroll['hours'])
+    by_role = payroll.sum_by('role', payroll['hours'] * 15)
 
     table = PrettyTable([ 'role', 'total' ])
 
@@ -193,7 +367,7 @@ def model_raise(context):
     print(table)
 
 
-@invoke.task
+@task
 def print_payroll_records(context):
     records = payroll_records(DATA / 'payroll.csv')
 
@@ -209,7 +383,7 @@ def print_payroll_records(context):
     print(table)
 
 
-@invoke.task
+@task
 def print_payroll_by_role(context):
     table = PrettyTable([ 'role', 'total' ])
 
@@ -220,38 +394,15 @@ def print_payroll_by_role(context):
     print(table)
 
 
-def profit_loss_records(path, filter=None):
-    path = Path(path)
-
-    records = { }
-
-    with path.open() as fd:
-        header = [ parse_date(h.strip())  for h in next(fd).split('|') ]
-
-        for line in fd:
-            line = line.strip()
-
-            if not line:
-                continue
-
-            record = {
-                h : parse_float(v.strip())
-                for h, v in zip(header, line.split('|'))
-            }
-
-            category = record['category']
-
-            if filter and category not in filter:
-                continue
-
-
-            for d, v in record.items():
-                if isinstance(d, date):
-                    key = (category, d)
+@timed('read_profit_loss')
+@disk_memoize(PSVMatrix)
+def read_profit_loss(path):
+    return read_psv(path)
 
-                    records[key] = v
 
-    return records
+@timed('profit_loss_records')
+def profit_loss_records(path, filter=None):
+    return read_profit_loss(path).records(filter)
 
 incomes = {
     'art sales',
@@ -322,107 +473,189 @@ expenses = {
     'over - lottery',
 }
 
+correction_groups = {
+    'incomes'  : incomes,
+    'expenses' : expenses,
+}
+
+
 @memoize
-def fixed_profit_loss_records(path, filter=None):
-    records = profit_loss_records(path, filter)
+def correction_rules(path):
+    return read_rules(path)
 
-    # Negate expenses for mathematical convenience
 
-    for (k, d), v in records.items():
-        if k in expenses:
-            records[(k,d)] = -v
+@timed('correct')
+def correct(records, corrections):
+    rules = correction_rules(corrections)
+    rules = compile_rules(rules, records.categories, records.months, correction_groups)
 
+    rules.apply(records.values)
+    count('correction rules', len(rules.rules))
 
-    # The filter might remove certain keys so we ignore KeyErrors
+    return rules
 
-    # Swapped bar and food sales
 
-    try:
-        month = date(2019, 9, 1)
-        left = ('bar sales', month)
-        right = ('food sales', month)
+@memoize
+@timed('fixed_profit_loss_records')
+def fixed_profit_loss_records(path, filter=None, corrections=DATA / 'corrections.psv'):
+    return fix_profit_loss(read_profit_loss(path), filter, corrections)
 
-        records[left], records[right] = records[right], records[left]
-    except KeyError:
-        pass
 
+def fix_profit_loss(matrix, filter=None, corrections=DATA / 'corrections.psv'):
+    records = ProfitLoss.from_psv(matrix)
 
-    # Payroll rolled over one month
+    if filter:
+        records = records.select(categories=filter)
 
-    try:
-        category = 'payroll - regular wages'
-        left = (category, date(2019, 9, 1))
-        right = (category, date(2019, 10, 1))
-        records[left] = records[right] / 2
-        records[right] = records[left]
-    except KeyError:
-        pass
+    correct(records, corrections)
 
+    return records.freeze()
 
-    # Zero out 'payroll - other'
 
-    try:
-        category = 'payroll - other'
-        start = date(2019, 1, 1)
-        end = date(2019, 12, 1)
+@task
+def print_correction_timings(context):
+    records = ProfitLoss.from_psv(read_profit_loss(DATA / 'profit_loss.psv'))
+    rules = correct(records, DATA / 'corrections.psv')
 
-        for month in months_in_range(start, end):
-            records[(category, month)] = 0.
-    except KeyError:
-        pass
+    table = PrettyTable([ 'rule', 'seconds' ])
+    table.align['rule'] = 'l'
+    table.align['seconds'] = 'r'
 
+    for name, seconds in rules.timings:
+        table.add_row([ name, '{:.6f}'.format(seconds) ])
 
-    # Lottery over/under is going wrong direction?
-    try:
-        category = 'over - lottery'
-        months = [
-            date(2019, 6, 1),
-            date(2019, 7, 1),
-        ]
+    print(table)
 
-        others = [
-            records[(c, m)]
-            for c, m in records if c == category and m not in months
-        ]
 
-        average = sum(others) / len(others)
+LOCATION = 'local'
 
-        for month in months:
-            key = (category, month)
-            records[key] = average
+REFERENCE = reference(2019, LOCATION)
 
-            # records[key] = -records[key]
-            # records[key] = 0
-    except KeyError:
-        pass
 
+@memoize
+def data_store():
+    store = Store.scan(LOCATIONS)
 
-    return records
+    # The original single venue files live directly in data/
+    if (LOCATION, 2019) not in store.partitions:
+        store.add(LOCATION, 2019, DATA)
 
+    return store
 
-@memoize
-def totals_2019():
+
+@task
+def print_partitions(context):
+    table = PrettyTable([ 'location', 'year', 'directory', 'files' ])
+    table.align['directory'] = 'l'
+    table.align['files'] = 'l'
+
+    for p in data_store():
+        files = sorted(f.name for f in p.directory.iterdir() if f.is_file())
+        table.add_row([ p.location, p.year, p.directory.relative_to(HERE), ', '.join(files) ])
+
+    print(table)
+
+
+def parse_locations(text):
+    return [ l.strip() for l in text.split(',') ]
+
+
+def task_reference(years, locations):
+    return parse_reference(years, parse_locations(locations))
+
+
+def partition_corrections(partition):
+    path = partition.directory / 'corrections.psv'
+    return path if path.exists() else DATA / 'corrections.psv'
+
+
+def partition_profit_loss(locations=None, years=None):
+    return [
+        (partition, fixed_profit_loss_records(path, None, partition_corrections(partition)))
+        for partition, path in data_store().files('profit_loss.psv', locations, years)
+    ]
+
+
+def partition_revenue_by_month(locations=None, years=None):
     totals = defaultdict(float)
 
-    records = fixed_profit_loss_records(DATA / 'profit_loss.psv')
+    for _, path in data_store().files('revenue.csv', locations, years):
+        for m, v in revenue_by_month(path).items():
+            totals[m] += v
 
-    for (c, m), v in records.items():
-        totals[c] += v
+    return dict(sorted(totals.items()))
 
-    return dict(totals)
 
+def partition_payroll_by_role(locations=None, years=None):
+    totals = defaultdict(float)
 
-@invoke.task
-def print_totals(context):
-    fmt = '{:02.2f}'
+    for _, path in data_store().files('payroll.csv', locations, years):
+        for role, v in payroll_by_role(path).items():
+            totals[role] += v
+
+    return dict(sorted(totals.items()))
 
+
+def parse_years(text):
+    return [ int(y) for y in text.split(',') ] if text else None
+
+
+@task
+def print_partition_revenue(context, locations='', years=''):
+    locations = parse_locations(locations) if locations else None
+    years = parse_years(years)
+
+    pprint(partition_revenue_by_month(locations, years))
+    pprint(partition_payroll_by_role(locations, years))
+
+
+def reference_partitions(reference):
+    weights = dict(reference.weights)
+    partitions = partition_profit_loss(reference.locations, weights)
+
+    # A missing partition would silently scale the blend down
+
+    found = { (p.location, p.year) for p, _ in partitions }
+    missing = [ (l, y) for l in reference.locations for y in weights if (l, y) not in found ]
+
+    if missing:
+        raise ValueError('no profit and loss data for reference. missing = {}'.format(missing))
+
+    return [ (weights[p.year], p, records) for p, records in partitions ]
+
+
+@memoize
+@timed('reference_months')
+def reference_months(category, reference=REFERENCE):
+    out = np.zeros(12)
+
+    for weight, partition, records in reference_partitions(reference):
+        for m in range(12):
+            out[m] += weight * records.get((category, date(partition.year, m + 1, 1)), 0.)
+
+    return tuple(out.tolist())
+
+
+@memoize
+@timed('reference_totals')
+def reference_totals(reference=REFERENCE):
     totals = defaultdict(float)
 
+    for weight, _, records in reference_partitions(reference):
+        for c, total in records.category_totals().items():
+            totals[c] += weight * total
+
+    return MappingProxyType(dict(totals))
+
+
+@task
+def print_totals(context):
+    fmt = '{:02.2f}'
+
     # records = fixed_profit_loss_records(DATA / 'profit_loss.psv', filter=PHASE_0)
     records = fixed_profit_loss_records(DATA / 'profit_loss.psv')
 
-    for (c, m), v in records.items():
-        totals[c] += v
+    totals = records.category_totals()
 
     table = PrettyTable(('category', 'total'))
     table.align['total'] = 'r'
@@ -461,7 +694,7 @@ def print_totals(context):
     print(table)
 
 
-@invoke.task
+@task
 def print_set_deltas(context):
     categories = { c for c, _ in profit_loss_records(DATA / 'profit_loss.psv') }
 
@@ -630,12 +863,12 @@ def model_phase_1():
     print(table)
 
 
-@invoke.task
+@task
 def print_phase_1_model(context):
     model_phase_1()
 
 
-@invoke.task
+@task
 def print_gross_ratios_by_month(context):
     fmt = '{:02.2f}'
 
@@ -655,30 +888,29 @@ def print_gross_ratios_by_month(context):
 
     table = PrettyTable(header)
 
-    for month in months_in_range(date(2019, 1, 1), date(2019, 12, 1)):
-        total = sum(v for (c, m), v in records.items() if c in grosses and m == month)
+    by_month = records.rows(sorted(grosses))
+    totals_by_month = by_month.sum(axis=0)
+
+    for month in month_periods(date(2019, 1, 1), date(2019, 12, 1)):
+        j = records.month_index[month]
+        total = totals_by_month[j]
 
         row = [ month ]
 
-        for g in sorted(grosses):
-            value = records[(g, month)] / total
+        for value in (by_month[:, j] / total).tolist():
             row.append(fmt.format(value))
 
         row.append(fmt.format(total))
 
         table.add_row(row)
 
-    totals_by_category = {
-        c : sum(v for (_, m), v in records.items() if _ == c)
-        for c in grosses
-    }
-
-    total = sum(totals_by_category.values())
+    totals_by_category = by_month.sum(axis=1)
+    total = totals_by_category.sum()
 
     row = [ 'year' ]
 
-    for c in sorted(grosses):
-        row.append(fmt.format(totals_by_category[c] / total))
+    for value in (totals_by_category / total).tolist():
+        row.append(fmt.format(value))
 
     row.append(total)
 
@@ -735,6 +967,15 @@ models =  r'''
 
 PHASES = { 0, 1, 2, 3 }
 
+# The guesses above as the possible number of months spent in each phase,
+# sampled uniformly.  Zero months of phase 0 means we don't go back.
+
+phase_durations = {
+    0 : [ 0, 3, 4, 5, 6 ],
+    1 : range(3, 16),
+    2 : range(3, 25),
+}
+
 @memoize
 def parse_models():
     lines = (line for line in map(str.strip, models.splitlines()) if line)
@@ -755,15 +996,15 @@ def parse_models():
 
             by_model[model][month] = int(phase)
 
-    return dict(by_model)
+    return MappingProxyType({ k : MappingProxyType(v) for k, v in by_model.items() })
 
 
-@invoke.task
+@task
 def print_months(context):
     start = date(2020, 10, 1)
     end = date(2022, 12, 1)
 
-    for m in months_in_range(start, end):
+    for m in month_periods(start, end):
         print(m)
 
 
@@ -773,91 +1014,91 @@ def sigmoid(alpha, x):
     return e / (1 + e)
 
 
-def reference_month(month):
-    reference = month.month
-    return date(2019, reference, 1)
-    
 
-def bar_sales_by_month_model(month, model):
-    months = parse_models()[model]
-    phase = months[month]
+phase_percentages = {
+    0 : 0.,
+    1 : 1/3,
+    2 : 2/3,
+    3 : 1,
+}
 
-    if phase == 0:
-        percentage = 0.
-    elif phase == 1:
-        percentage = 1/3
-    elif phase == 2:
-        percentage = 2/3
-    elif phase == 3:
-        percentage = 1
-    else:
+
+def phase_percentage(phase):
+    try:
+        return phase_percentages[phase]
+    except KeyError:
         raise ValueError('phase not valid. phase = {}'.format(phase))
 
-    records = fixed_profit_loss_records(DATA / 'profit_loss.psv')
 
-    key = ('bar sales', reference_month(month))
+@timed('bar_sales_by_month_model')
+def bar_sales_by_month_model(month, model, reference=REFERENCE):
+    months = parse_models()[model]
+    phase = months[month]
+
+    percentage = phase_percentage(phase)
 
-    return percentage * records[key]
+    return percentage * reference_months('bar sales', reference)[month.month - 1]
 
 
-def bar_costs_by_month_model(month, model):
-    sales = bar_sales_by_month_model(month, model)
+@timed('bar_costs_by_month_model')
+def bar_costs_by_month_model(month, model, reference=REFERENCE):
+    sales = bar_sales_by_month_model(month, model, reference)
 
-    totals = totals_2019()
+    totals = reference_totals(reference)
     ratio = totals['bar purchases'] / totals['bar sales']
 
     return ratio * sales
 
 
-def food_sales_by_month_model(month, model):
+@timed('food_sales_by_month_model')
+def food_sales_by_month_model(month, model, reference=REFERENCE):
     months = parse_models()[model]
     phase = months[month]
 
-    if phase == 0:
-        percentage = 0.
-    elif phase == 1:
-        percentage = 1/3
-    elif phase == 2:
-        percentage = 2/3
-    elif phase == 3:
-        percentage = 1
-    else:
-        raise ValueError('phase not valid. phase = {}'.format(phase))
-
-    records = fixed_profit_loss_records(DATA / 'profit_loss.psv')
+    percentage = phase_percentage(phase)
 
-    key = ('food sales', reference_month(month))
+    return percentage * reference_months('food sales', reference)[month.month - 1]
 
-    return percentage * records[key]
 
+@timed('food_costs_by_month_model')
+def food_costs_by_month_model(month, model, reference=REFERENCE):
+    sales = food_sales_by_month_model(month, model, reference)
 
-def food_costs_by_month_model(month, model):
-    sales = food_sales_by_month_model(month, model)
-
-    totals = totals_2019()
+    totals = reference_totals(reference)
     ratio = totals['food purchases'] / totals['food sales']
 
     return ratio * sales
     
 
-def rent_by_month(month):
-    if month <= date(2020, 9, 1):
-        return -3375.
+rent_schedule = [
+    (date(2020, 9, 1), -3375.),
+    (date(2022, 9, 1), -3500.),
+    (date(2024, 9, 1), -3600.),
+]
 
-    if month <= date(2022, 9, 1):
-        return -3500.
 
-    if month <= date(2024, 9, 1):
-        return -3600.
+@timed('rent_by_month')
+def rent_by_month(month):
+    for until, rent in rent_schedule:
+        if month <= until:
+            return rent
 
 
-def utilites_by_month(month):
-    totals = totals_2019()
+@timed('utilites_by_month')
+def utilites_by_month(month, reference=REFERENCE):
+    totals = reference_totals(reference)
     amortized = totals['utilities'] / 12
 
     return amortized
 
 
+weekly_payroll = {
+    'manager'   : 20 * 35.,
+    'secondary' : 15 * 35.,
+}
+
+
+@timed('payroll_by_month_model')
 def payroll_by_month_model(month, model):
     phase = parse_models()[model][month]
 
@@ -874,8 +1115,8 @@ def payroll_by_month_model(month, model):
     if phase == 0:
         return out
 
-    manager_weekly   = 20 * 35.
-    secondary_weekly = 15 * 35.
+    manager_weekly   = weekly_payroll['manager']
+    secondary_weekly = weekly_payroll['secondary']
 
     next_month = month_inc(month)
     delta = next_month - month
@@ -888,8 +1129,9 @@ def payroll_by_month_model(month, model):
     return out
 
 
-def payroll_taxes_by_month_model(month, model):
-    totals = totals_2019()
+@timed('payroll_taxes_by_month_model')
+def payroll_taxes_by_month_model(month, model, reference=REFERENCE):
+    totals = reference_totals(reference)
 
     payroll = payroll_by_month_model(month, model)
     ratio = totals['taxes - payroll'] / totals['payroll - regular wages']
@@ -897,23 +1139,25 @@ def payroll_taxes_by_month_model(month, model):
     return ratio * payroll
 
 
-def lottery_by_month_model(month, model):
+@timed('lottery_by_month_model')
+def lottery_by_month_model(month, model, reference=REFERENCE):
     phase = parse_models()[model][month]
 
     if phase == 0:
         return 0.
 
-    average = totals_2019()['lottery commission'] / 12
+    average = reference_totals(reference)['lottery commission'] / 12
     return average
 
 
-def entertainment_by_month_model(month, model):
+@timed('entertainment_by_month_model')
+def entertainment_by_month_model(month, model, reference=REFERENCE):
     phase = parse_models()[model][month]
 
     if phase in (0, 1):
         return 0.
 
-    average = totals_2019()['entertainment'] / 12
+    average = reference_totals(reference)['entertainment'] / 12
 
     if phase == 2:
         return average / 2
@@ -922,11 +1166,13 @@ def entertainment_by_month_model(month, model):
         return average
 
 
-def over_lottery_by_month_model(month, model):
+@timed('over_lottery_by_month_model')
+def over_lottery_by_month_model(month, model, reference=REFERENCE):
     return 0.
 
 
-def over_bar_by_month_model(month, model):
+@timed('over_bar_by_month_model')
+def over_bar_by_month_model(month, model, reference=REFERENCE):
     return 0.
 
 
@@ -940,7 +1186,8 @@ class FakeTable(dict):
 
 
 @memoize
-def values_by_month_model(month, model):
+@timed('values_by_month_model')
+def values_by_month_model(month, model, reference=REFERENCE):
     phase = parse_models()[model][month]
 
     table = FakeTable([ '', 'value'])
@@ -949,40 +1196,40 @@ def values_by_month_model(month, model):
     table.add_row([ 'month', month ])
     table.add_row([ 'phase', phase ])
 
-    bar_sales = bar_sales_by_month_model(month, model)
+    bar_sales = bar_sales_by_month_model(month, model, reference)
     table.add_row([ 'bar sales', bar_sales ])
 
-    bar_costs = bar_costs_by_month_model(month, model)
+    bar_costs = bar_costs_by_month_model(month, model, reference)
     table.add_row([ 'bar costs', bar_costs ])
 
-    food_sales = food_sales_by_month_model(month, model)
+    food_sales = food_sales_by_month_model(month, model, reference)
     table.add_row([ 'food sales', food_sales ])
 
-    food_costs = food_costs_by_month_model(month, model)
+    food_costs = food_costs_by_month_model(month, model, reference)
     table.add_row([ 'food costs', food_costs ])
 
-    lottery_commission = lottery_by_month_model(month, model)
+    lottery_commission = lottery_by_month_model(month, model, reference)
     table.add_row([ 'lottery commission', lottery_commission ])
 
     rent = rent_by_month(month)
     table.add_row([ 'rent', rent ])
 
-    utilities = utilites_by_month(month)
+    utilities = utilites_by_month(month, reference)
     table.add_row([ 'utilities', utilities ])
 
     payroll = payroll_by_month_model(month, model)
     table.add_row([ 'payroll - regular wages', payroll ])
 
-    payroll_taxes = payroll_taxes_by_month_model(month, model)
+    payroll_taxes = payroll_taxes_by_month_model(month, model, reference)
     table.add_row([ 'taxes - payroll', payroll_taxes ])
 
-    entertainment = entertainment_by_month_model(month, model)
+    entertainment = entertainment_by_month_model(month, model, reference)
     table.add_row([ 'entertainment', entertainment ])
 
-    over_lottery = over_lottery_by_month_model(month, model)
+    over_lottery = over_lottery_by_month_model(month, model, reference)
     table.add_row([ 'over - lottery', over_lottery ])
 
-    over_bar = over_bar_by_month_model(month, model)
+    over_bar = over_bar_by_month_model(month, model, reference)
     table.add_row([ 'over - bar', over_bar ])
 
     gross = (
@@ -1009,11 +1256,98 @@ def values_by_month_model(month, model):
 
 
     # print(table)
-    return table
+    return MappingProxyType(table)
 
 
-@invoke.task
-def print_test_month(context):
+@memoize
+@timed('model_assumptions')
+def model_assumptions(reference=REFERENCE):
+    # Memoized and shared, so nothing handed out here may be written to
+
+    by_month = { }
+
+    for c in ('bar sales', 'food sales'):
+        by_month[c] = np.array(reference_months(c, reference))
+        by_month[c].flags.writeable = False
+
+    return Assumptions(
+        MappingProxyType(by_month),
+        reference_totals(reference),
+        MappingProxyType(phase_percentages),
+        tuple(rent_schedule),
+        MappingProxyType(weekly_payroll),
+    )
+
+
+@memoize
+@timed('scenario_cube')
+def scenario_cube(reference=REFERENCE):
+    models, months, phases = phase_matrix(parse_models())
+    cube = evaluate(models, months, phases, model_assumptions(reference))
+    cube.values.flags.writeable = False
+    count('model evaluations', len(models) * len(months))
+
+    return cube
+
+
+@task
+def print_scenarios(context, reference='2019', locations=LOCATION):
+    fmt = '{: 2.02f}'
+
+    cube = scenario_cube(task_reference(reference, locations))
+    net = cube.item('net')
+
+    table = PrettyTable([ 'month', *cube.models ])
+    for c in cube.models:
+        table.align[c] = 'r'
+
+    for j, m in enumerate(cube.months):
+        table.add_row([ fmt_month(m) ] + [ fmt.format(v) for v in net[:, j].tolist() ])
+
+    table.add_row([ 'total' ] + [ fmt.format(v) for v in net.sum(axis=1).tolist() ])
+
+    print(table)
+
+
+@memoize
+def net_by_phase():
+    months = scenario_cube().months
+    phases = sorted(PHASES)
+
+    schedule = np.repeat(np.array(phases)[:, None], len(months), axis=1)
+    cube = evaluate(phases, months, schedule, model_assumptions())
+    cube.values.flags.writeable = False
+
+    return cube.item('net')
+
+
+@task
+def simulate_scenarios(context, runs=100000, jobs=0, seed=0):
+    fmt = '{: 2.02f}'
+
+    months = scenario_cube().months
+
+    monthly = simulate(net_by_phase(), phase_durations, runs, seed=seed, jobs=jobs)
+    bands = percentile_bands(monthly)
+
+    for title, values in (('monthly net', bands.monthly), ('cumulative net', bands.cumulative)):
+        header = [ 'month' ] + [ 'p{}'.format(p) for p in bands.percentiles ]
+
+        table = PrettyTable(header)
+        table.title = title
+
+        for h in header[1:]:
+            table.align[h] = 'r'
+
+        for j, m in enumerate(months):
+            table.add_row([ fmt_month(m) ] + [ fmt.format(v) for v in values[:, j].tolist() ])
+
+        print(table)
+        print()
+
+
+@task
+def print_test_month(context, reference='2019', locations=LOCATION):
     fmt = '{: 2.02f}'
 
     month = date(2021, 6, 1)
@@ -1021,7 +1355,7 @@ def print_test_month(context):
 
     table = PrettyTable([ '', 'value' ])
 
-    values = values_by_month_model(month, model)
+    values = values_by_month_model(month, model, task_reference(reference, locations))
 
     for k, v in values.items():
         if isinstance(v, float):
@@ -1032,15 +1366,92 @@ def print_test_month(context):
     print(table)
 
 
-@invoke.task
+@task
 def print_models(context):
     models = parse_models()
 
-    pprint(models)
+    pprint({ k : dict(v) for k, v in models.items() })
+
+
+def column_letters(index):
+    # 1 is A, 26 is Z, 27 is AA and so on, with no upper bound
+
+    if index < 1:
+        raise ValueError('column index not valid. index = {}'.format(index))
+
+    letters = [ ]
 
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters.append(chr(ord('A') + remainder))
 
-excel_columns = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-excel_columns.extend([ 'A' + a for a in excel_columns ])
+    return ''.join(reversed(letters))
+
+
+def column_index(letters):
+    if not letters:
+        raise ValueError('column letters not valid. letters = {}'.format(letters))
+
+    index = 0
+
+    for c in letters.upper():
+        if not 'A' <= c <= 'Z':
+            raise ValueError('column letters not valid. letters = {}'.format(letters))
+
+        index = index * 26 + ord(c) - ord('A') + 1
+
+    return index
+
+
+MONTH_FORMAT = 'm/yyyy'
+AMOUNT_FORMAT = '0.00'
+
+number_formats = {
+    'month' : MONTH_FORMAT,
+    'phase' : '0',
+}
+
+# Rows of native values share one number format for every value cell,
+# where the default rows carry fmt_value strings instead
+StyledRow = namedtuple('StyledRow', [ 'values', 'number_format' ])
+
+
+def native_floats(values):
+    return [ None if v != v else v for v in values.tolist() ]
+
+
+def append_row(sheet, row):
+    if not isinstance(row, StyledRow):
+        sheet.append(row)
+        return len(row)
+
+    sheet.append(row.values)
+
+    if row.number_format:
+        for cell in sheet[sheet.max_row][1:]:
+            cell.number_format = row.number_format
+
+    return len(row.values)
+
+
+def write_only_row(sheet, row):
+    from openpyxl.cell import WriteOnlyCell
+
+    if not isinstance(row, StyledRow):
+        return row
+
+    if not row.number_format:
+        return row.values
+
+    label, *values = row.values
+    cells = [ label ]
+
+    for v in values:
+        cell = WriteOnlyCell(sheet, v)
+        cell.number_format = row.number_format
+        cells.append(cell)
+
+    return cells
 
 line_items = {
     'month'                         : 'Month',
@@ -1136,69 +1547,120 @@ line_items = {
 }
 
 
-def fill_model_sheet(model, sheet):
-    start_date = date(2020, 10, 1)
-    end_date   = date(2022, 12, 1)
+@timed('fill_model_sheet')
+def fill_model_sheet(model, sheet, reference=REFERENCE, native=False):
+    for row in model_sheet_rows(model, model_months(), reference, native):
+        count('cells written', append_row(sheet, row))
+
+
+@timed('fill_profit_loss')
+def fill_profit_loss(sheet, records, year, native=False):
+    for row in profit_loss_rows(records, year, native):
+        count('cells written', append_row(sheet, row))
+
+
+def profit_loss_title(partition, reference):
+    if len(reference.locations) > 1:
+        return '{} {} Profit and Loss'.format(partition.location, partition.year)
+
+    return '{} Profit and Loss'.format(partition.year)
+
+
+@timed('projection_workbook')
+def projection_workbook(reference=REFERENCE, native=False, jobs=1):
+    from openpyxl import Workbook
+
+    book = Workbook()
+    book.remove(book.active)
+
+    for _, partition, records in reference_partitions(reference):
+        sheet = book.create_sheet(profit_loss_title(partition, reference))
+        fill_profit_loss(sheet, records, partition.year, native)
+
+    if jobs == 1:
+        for model in parse_models():
+            sheet = book.create_sheet(model)
+            fill_model_sheet(model, sheet, reference, native)
+
+        return book
+
+    for model, rows in model_sheets(reference, native, jobs=jobs):
+        sheet = book.create_sheet(model)
 
-    months = list(months_in_range(start_date, end_date))
+        for row in rows:
+            count('cells written', append_row(sheet, row))
 
-    def set_cell(col, row, value):
-        nonlocal sheet
+    return book
 
-        cell = '{}{}'.format(col, row)
-        sheet[cell] = value
 
+def model_months():
+    return month_periods(date(2020, 10, 1), date(2022, 12, 1))
 
-    row = 1
 
-    for c, m in zip(excel_columns[1:], months):
-        set_cell(c, row, fmt_month(m))
+def line_item_rows(header, columns, styled=False):
+    # Every line item names the current row, but only one with values moves
+    # on to the next, so items the model lacks are overwritten by the next
+
+    row = [ None ] + header
 
     for key, name in line_items.items():
-        set_cell('A', row, name)
+        row[0] = name
 
-        wrote_row = False
+        if key not in columns:
+            continue
 
-        for col, m in zip(excel_columns[1:], months):
-            values = values_by_month_model(m, model)
+        row[1:] = columns[key]
+        yield StyledRow(row, number_formats.get(key, AMOUNT_FORMAT)) if styled else row
 
-            if key not in values:
-                break
+        row = [ None ] * (len(header) + 1)
 
-            wrote_row = True
+    if row[0] is not None:
+        yield StyledRow(row, None) if styled else row
 
-            v = values[key]
-            set_cell(col, row, fmt_value(v))
 
-        if wrote_row:
-            row += 1 
+@timed('model_matrix')
+def model_matrix(model, months, reference=REFERENCE):
+    cube = scenario_cube(reference)
+    count('model sheets')
 
+    return cube, cube.model(model)[[ cube.month_index[m] for m in months ]]
 
-def fill_profit_loss(sheet):
-    records = fixed_profit_loss_records(DATA / 'profit_loss.psv')
 
-    def set_cell(col, row, value):
-        nonlocal sheet
+def matrix_rows(model, months, items, matrix, native=False):
+    header = list(months) if native else [ fmt_month(m) for m in months ]
 
-        cell = '{}{}'.format(col, row)
-        sheet[cell] = value
+    columns = {
+        'model' : [ model ] * len(months),
+        'month' : header,
+    }
 
-    start_date = date(2019, 1, 1)
-    end_date   = date(2019, 12, 1)
-    months = list(months_in_range(start_date, end_date))
+    for item, values in zip(items, matrix.T):
+        if item == 'phase':
+            columns[item] = values.astype(np.int64).tolist()
+        elif native:
+            columns[item] = native_floats(values)
+        else:
+            columns[item] = fmt_floats(values)
+
+    return line_item_rows(header, columns, styled=native)
 
-    by_item = defaultdict(dict)
-    for (k, m), v in records.items():
-        by_item[k][m] = v
 
+def model_sheet_rows(model, months, reference=REFERENCE, native=False):
+    cube, matrix = model_matrix(model, months, reference)
+    return matrix_rows(model, months, cube.items, matrix, native)
 
-    row = 1
-    set_cell('A', row, 'Month')
 
-    for c, m in zip(excel_columns[1:], months):
-        set_cell(c, row, fmt_value(m))
+def profit_loss_rows(records, year, native=False):
+    months = month_periods(date(year, 1, 1), date(year, 12, 1))
+
+    by_item = defaultdict(dict)
+    for (k, m), v in records.items():
+        by_item[k][m] = v
 
-    row += 1
+    if not native:
+        yield [ 'Month' ] + [ fmt_value(m) for m in months ]
+    else:
+        yield StyledRow([ 'Month' ] + list(months), MONTH_FORMAT)
 
     for key, name in line_items.items():
         values_by_month = by_item.get(key)
@@ -1206,33 +1668,296 @@ def fill_profit_loss(sheet):
         if not values_by_month:
             continue
 
-        set_cell('A', row, name)
+        values = [ values_by_month.get(m) for m in months ]
+
+        if not native:
+            yield [ name ] + [ fmt_value(v) for v in values ]
+        else:
+            values = [ None if v is None or v != v else v for v in values ]
+            yield StyledRow([ name ] + values, AMOUNT_FORMAT)
+
+
+def projection_sheets(reference=REFERENCE, native=False, jobs=1):
+    for _, partition, records in reference_partitions(reference):
+        yield profit_loss_title(partition, reference), profit_loss_rows(records, partition.year, native)
+
+    yield from model_sheets(reference, native, jobs=jobs)
+
+
+def line_item_positions(columns):
+    # Row of every line item as laid out by line_item_rows
+    keys = [ key for key in line_items if key in columns ]
+    return { key : row for row, key in enumerate(keys, 1) }
+
+
+def sheet_range(sheet, column, first, last):
+    return "'{0}'!${1}${2}:${1}${3}".format(sheet, column, first, last)
+
+
+def sheet_cell(sheet, column, row):
+    return "'{}'!${}${}".format(sheet, column, row)
+
+
+ASSUMPTIONS = 'Assumptions'
+
+
+def assumption_rows(assumptions):
+    totals = assumptions.totals
+
+    ratios = [
+        ('bar cost ratio',             'bar costs / bar sales',            totals['bar purchases'] / totals['bar sales']),
+        ('food cost ratio',            'food costs / food sales',          totals['food purchases'] / totals['food sales']),
+        ('payroll tax ratio',          'payroll taxes / regular wages',    totals['taxes - payroll'] / totals['payroll - regular wages']),
+        ('monthly lottery commission', 'lottery commission per month',     totals['lottery commission'] / 12),
+        ('monthly utilities',          'utilities per month',              totals['utilities'] / 12),
+        ('monthly entertainment',      'entertainment per month',          totals['entertainment'] / 12),
+    ]
+
+    rows = [ ]
+    refs = { }
+
+    def section(header, body):
+        rows.append(header)
+        first = len(rows) + 1
+        rows.extend(body)
+        rows.append([ ])
+
+        return first, first + len(body) - 1
+
+    first, _ = section([ 'Cost ratios', 'Value' ], [ [ label, v ] for _, label, v in ratios ])
+
+    for i, (name, _, _) in enumerate(ratios):
+        refs[name] = sheet_cell(ASSUMPTIONS, 'B', first + i)
+
+    phases = sorted(assumptions.phase_percentages.items())
+    first, last = section([ 'Phase', 'Percentage' ], [ [ p, v ] for p, v in phases ])
+    refs['phase percentages'] = "'{}'!$A${}:$B${}".format(ASSUMPTIONS, first, last)
+
+    # A month pays the rent of the first schedule entry it is not past
+    schedule = [ [ until, amount ] for until, amount in assumptions.rent_schedule ]
+    first, last = section([ 'Rent until', 'Rent' ], schedule)
+    refs['rent until'] = sheet_range(ASSUMPTIONS, 'A', first, last)
+    refs['rent amounts'] = sheet_range(ASSUMPTIONS, 'B', first, last)
+
+    payroll = [ [ role, weekly ] for role, weekly in assumptions.weekly_payroll.items() ]
+    first, last = section([ 'Payroll', 'Weekly' ], payroll + [ [ 'total', None ] ])
+    rows[last - 1][1] = '=SUM(B{}:B{})'.format(first, last - 1)
+    refs['weekly payroll'] = sheet_cell(ASSUMPTIONS, 'B', last)
+
+    reference = assumptions.reference
+    by_month = zip(range(1, 13), reference['bar sales'].tolist(), reference['food sales'].tolist())
+    first, last = section([ 'Reference month', 'Bar sales', 'Food sales' ], [ list(r) for r in by_month ])
+    refs['reference bar sales'] = sheet_range(ASSUMPTIONS, 'B', first, last)
+    refs['reference food sales'] = sheet_range(ASSUMPTIONS, 'C', first, last)
+
+    return rows, refs
+
+
+model_formulas = {
+    'bar sales'               : '=VLOOKUP({phase}, {phase percentages}, 2, FALSE) * INDEX({reference bar sales}, MONTH({month}))',
+    'bar costs'               : '={bar cost ratio} * {bar sales}',
+    'food sales'              : '=VLOOKUP({phase}, {phase percentages}, 2, FALSE) * INDEX({reference food sales}, MONTH({month}))',
+    'food costs'              : '={food cost ratio} * {food sales}',
+    'lottery commission'      : '=IF({phase} = 0, 0, {monthly lottery commission})',
+    'rent'                    : '=INDEX({rent amounts}, COUNTIF({rent until}, "<" & {month}) + 1)',
+    'utilities'               : '={monthly utilities}',
+    'payroll - regular wages' : '=IF({phase} = 0, 0, -(DATE(YEAR({month}), MONTH({month}) + 1, 1) - {month}) / 7 * {weekly payroll})',
+    'taxes - payroll'         : '={payroll tax ratio} * {payroll - regular wages}',
+    'entertainment'           : '=IF({phase} = 3, {monthly entertainment}, IF({phase} = 2, {monthly entertainment} / 2, 0))',
+    'over - lottery'          : 0,
+    'over - bar'              : 0,
+    'gross'                   : '={bar sales} + {food sales} + {lottery commission}',
+    'costs'                   : '={bar costs} + {food costs} + {rent} + {utilities} + {payroll - regular wages} + {taxes - payroll} + {entertainment}',
+    'net'                     : '={gross} + {costs}',
+}
+
+
+def formula_sheet_rows(model, months, phases, refs):
+    columns = {
+        'model' : [ model ] * len(months),
+        'month' : list(months),
+        'phase' : [ phases[m] for m in months ],
+    }
+
+    columns.update((key, None) for key in model_formulas)
+
+    positions = line_item_positions(columns)
+
+    for key, formula in model_formulas.items():
+        if not isinstance(formula, str):
+            columns[key] = [ formula ] * len(months)
+            continue
+
+        cells = [ ]
+
+        for j in range(len(months)):
+            column = column_letters(j + 2)
+            local = { k : '{}{}'.format(column, row) for k, row in positions.items() }
+            cells.append(formula.format_map({ **refs, **local }))
+
+        columns[key] = cells
+
+    return line_item_rows(list(months), columns, styled=True)
+
+
+def formula_sheets(reference=REFERENCE, jobs=1):
+    for _, partition, records in reference_partitions(reference):
+        yield profit_loss_title(partition, reference), profit_loss_rows(records, partition.year)
+
+    rows, _ = assumption_rows(model_assumptions(reference))
+    yield ASSUMPTIONS, rows
+
+    yield from model_sheets(reference, formulas=True, jobs=jobs)
+
+
+def sheet_rows(model, reference=REFERENCE, native=False, formulas=False):
+    months = model_months()
+
+    if not formulas:
+        return model_sheet_rows(model, months, reference, native)
+
+    _, refs = assumption_rows(model_assumptions(reference))
+    return formula_sheet_rows(model, months, parse_models()[model], refs)
 
-        for c, m in zip(excel_columns[1:], months):
-            v = by_item[key][m]
-            set_cell(c, row, fmt_value(v))
 
-        row += 1
+def model_sheet_job(job):
+    return list(sheet_rows(*job))
 
 
-@invoke.task
-def make_projection_spreadsheet(context):
+def model_sheets(reference=REFERENCE, native=False, formulas=False, jobs=1):
+    models = list(parse_models())
+    work = [ (model, reference, native, formulas) for model in models ]
+
+    jobs = jobs or os.cpu_count()
+
+    if jobs == 1 or len(models) == 1:
+        for job in work:
+            yield job[0], sheet_rows(*job)
+
+        return
+
+    # Workers evaluate and format whole sheets, and map hands them back in
+    # model order however the workers finish
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from zip(models, pool_map(pool, model_sheet_job, work))
+
+
+def write_model_workbook(job):
+    path, model, reference, native, formulas = job
+
+    sheets = [ (model, sheet_rows(model, reference, native, formulas)) ]
+
+    if formulas:
+        rows, _ = assumption_rows(model_assumptions(reference))
+        sheets.insert(0, (ASSUMPTIONS, rows))
+
+    stream_workbook(path, sheets)
+
+    return path
+
+
+def model_workbook_name(model):
+    return '{}.xlsx'.format(''.join(c if c.isalnum() or c in '-_' else '_' for c in model))
+
+
+@timed('stream_workbook')
+def stream_workbook(filename, sheets):
     from openpyxl import Workbook
 
-    book = Workbook()
+    # Write-only sheets serialize each appended row straight to a temporary
+    # file, so memory holds one row of one sheet at a time
 
-    sheet = book.active
-    fill_profit_loss(sheet)
-    sheet.title = '2019 Profit and Loss'
+    book = Workbook(write_only=True)
 
-    for model in parse_models():
-        sheet = book.create_sheet(model)
-        fill_model_sheet(model, sheet)
+    for title, rows in sheets:
+        sheet = book.create_sheet(title)
+
+        for row in rows:
+            sheet.append(write_only_row(sheet, row))
+            count('rows streamed')
+
+    with stage('save workbook'):
+        book.save(filename)
+
+
+@task
+def make_projection_spreadsheet(context, reference='2019', locations=LOCATION, stream=False, formulas=False, native=False, jobs=1):
+    reference = task_reference(reference, locations)
+    filename = 'local_lounge_projections.xlsx'
+
+    if formulas:
+        stream_workbook(filename, formula_sheets(reference, jobs))
+        return
+
+    if stream:
+        stream_workbook(filename, projection_sheets(reference, native, jobs))
+        return
+
+    book = projection_workbook(reference, native, jobs)
+
+    with stage('save workbook'):
+        book.save(filename=filename)
+
+
+@task
+def make_model_workbooks(context, directory='projections', reference='2019', locations=LOCATION, formulas=False, native=False, jobs=0):
+    reference = task_reference(reference, locations)
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    work = [
+        (directory / model_workbook_name(model), model, reference, native, formulas)
+        for model in parse_models()
+    ]
+
+    jobs = jobs or os.cpu_count()
+
+    if jobs == 1:
+        paths = list(map(write_model_workbook, work))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            paths = list(pool_map(pool, write_model_workbook, work))
+
+    for path in paths:
+        print(path)
+
+
+@task
+def bench(context, filter='', repeat=3, scale='1', save=True, compare=None):
+    import bench
+
+    scales = [ int(s) for s in scale.split(',') ]
+    results = bench.run(filter, repeat, scales)
+
+    previous = bench.baseline(results, bench.load(compare)) if compare else { }
+
+    table = PrettyTable([ 'benchmark', 'scale', 'seconds', 'baseline', 'ratio' ])
+    table.align['benchmark'] = 'l'
+
+    for column in [ 'scale', 'seconds', 'baseline', 'ratio' ]:
+        table.align[column] = 'r'
+
+    for scale, timings in results.items():
+        for name, seconds in timings.items():
+            before = previous.get((scale, name))
+
+            table.add_row([
+                name,
+                scale,
+                '{:.6f}'.format(seconds),
+                '' if before is None else '{:.6f}'.format(before),
+                '' if not before else '{:.2f}'.format(seconds / before),
+            ])
+
+    print(table)
 
-    book.save(filename='local_lounge_projections.xlsx')
+    if save:
+        print('saved', bench.save(results, repeat))
 
 
-@invoke.task
+@task
 def print_delta(context):
     actual = { k for (k, _) in fixed_profit_loss_records(DATA / 'profit_loss.psv') }
     done = line_items.keys()